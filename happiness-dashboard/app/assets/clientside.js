@@ -0,0 +1,237 @@
+// Clientside callbacks for interactions that only touch the UI state.
+// Registered in app/callbacks.py with ClientsideFunction('dashboard', <name>).
+
+// Bumped on every routed filter change, so a slow pre-rendered load does not
+// overwrite the figures of a newer view
+var latestRoute = 0;
+// True while the pre-rendered files, not the figure callbacks, supply the figures
+var showingPrerendered = false;
+
+// Lazy mode: graphs in view (null until first reported) and the filters last
+// passed on to each graph's callbacks
+var visibleGraphs = null;
+var forwardedFilters = {};
+
+function observeGraphs(graphIds) {
+    var button = document.getElementById('graph-visibility');
+    var targets = graphIds.map(function (graphId) { return document.getElementById(graphId); });
+    if (!button || targets.indexOf(null) !== -1) {
+        // The layout is not in the page yet
+        setTimeout(function () { observeGraphs(graphIds); }, 100);
+        return;
+    }
+    if (!window.IntersectionObserver) {
+        visibleGraphs = graphIds.slice();
+        button.click();
+        return;
+    }
+    var inView = {};
+    var observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) { inView[entry.target.id] = entry.isIntersecting; });
+        var visible = graphIds.filter(function (graphId) { return inView[graphId]; });
+        if (!sameValue(visible, visibleGraphs)) {
+            visibleGraphs = visible;
+            button.click();
+        }
+    }, {rootMargin: '200px 0px'});
+    targets.forEach(function (target) { observer.observe(target); });
+}
+
+// Dim a graph whose figure no longer matches the filters (stale) until it catches up
+function markStale(graphId, stale) {
+    var graph = document.getElementById(graphId);
+    if (!graph) {
+        return;
+    }
+    graph.style.transition = 'opacity 0.3s ease';
+    graph.style.opacity = stale ? '0.4' : '';
+    if (stale) {
+        graph.setAttribute('data-stale', 'true');
+    } else {
+        graph.removeAttribute('data-stale');
+    }
+}
+
+function showFrame(figure, year) {
+    var names = figure.frames.map(function (frame) { return frame.name; });
+    var active = names.indexOf(String(year));
+    if (active === -1) {
+        return null;
+    }
+    var frame = figure.frames[active];
+    var slider = Object.assign({}, figure.layout.sliders[0], {active: active});
+    var layout = Object.assign({}, figure.layout, {sliders: [slider]});
+    if (frame.layout && frame.layout.title) {
+        layout.title = frame.layout.title;
+    }
+    return Object.assign({}, figure, {data: frame.data, layout: layout});
+}
+
+function sameValue(a, b) {
+    return JSON.stringify(a === undefined ? null : a) === JSON.stringify(b === undefined ? null : b);
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        // Slide the menu sidebar in or out
+        toggleMenu: function (nClicks, currentStyle) {
+            if (!nClicks) {
+                return window.dash_clientside.no_update;
+            }
+            var shown = currentStyle.transform === 'translateX(0)';
+            return Object.assign({}, currentStyle, {
+                transform: shown ? 'translateX(-100%)' : 'translateX(0)'
+            });
+        },
+
+        // Collapse or expand the filter form and rotate its toggle icon
+        toggleFilterForm: function (nClicks, isOpen) {
+            var newIsOpen = nClicks === null || nClicks === undefined ? true : !isOpen;
+            return [newIsOpen, {
+                cursor: 'pointer',
+                transform: newIsOpen ? 'rotate(0deg)' : 'rotate(90deg)',
+                transition: 'transform 0.3s ease'
+            }];
+        },
+
+        // Add the clicked country to the selection, or remove it if already selected
+        selectClickedCountry: function (clickData, currentCountries) {
+            if (!clickData) {
+                return window.dash_clientside.no_update;
+            }
+            // The map is keyed by ISO-3 code; the country name is the hover text
+            var point = clickData.points[0];
+            var clicked = point.hovertext || point.location;
+            if (!currentCountries || !currentCountries.length) {
+                return [clicked];
+            }
+            if (currentCountries.indexOf(clicked) !== -1) {
+                return currentCountries.filter(function (country) { return country !== clicked; });
+            }
+            return currentCountries.concat([clicked]);
+        },
+
+        // Show the selected year's frame of an animated figure (app/figure_frames.py
+        // show_year does the same on the server)
+        showYearFrame: function (year, figure) {
+            if (!figure || !figure.frames) {
+                return window.dash_clientside.no_update;
+            }
+            return showFrame(figure, year) || window.dash_clientside.no_update;
+        },
+
+        // Send unfiltered views to the pre-rendered figure files (app/figure_assets.py)
+        // and everything else to the figure callbacks, through the server-* stores.
+        // Only the stores that changed are set, so callbacks that ignore a filter stay idle.
+        routeFigureRequest: function (year, regions, countries, range,
+                                      serverYear, serverRegions, serverCountries, serverRange,
+                                      prerenderedView, assets) {
+            var noUpdate = window.dash_clientside.no_update;
+            latestRoute += 1;
+            var unfiltered = assets && !(regions && regions.length) && !(countries && countries.length) &&
+                (!range || (range[0] <= assets.range[0] && range[1] >= assets.range[1]));
+            if (unfiltered && assets.years.indexOf(year) !== -1) {
+                showingPrerendered = true;
+                forwardedFilters = {};
+                return [noUpdate, noUpdate, noUpdate, noUpdate, {year: year, route: latestRoute}];
+            }
+            showingPrerendered = false;
+            var filters = [year, regions, countries, range];
+            var current = [serverYear, serverRegions, serverCountries, serverRange];
+            var outputs = filters.map(function (value, index) {
+                // Coming from a pre-rendered view every figure is out of date
+                return prerenderedView || !sameValue(value, current[index]) ? value : noUpdate;
+            });
+            return outputs.concat([prerenderedView ? null : noUpdate]);
+        },
+
+        // Load the pre-rendered figures of an unfiltered view, with the signatures
+        // the patch callbacks compare against afterwards
+        loadPrerenderedFigures: function (view, assets, year, regions, countries, range) {
+            var noUpdate = window.dash_clientside.no_update;
+            if (!view || !assets) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            var signed = Object.keys(assets.signatures);
+            var noFilterUpdates = [noUpdate, noUpdate, noUpdate, noUpdate];
+            return Promise.all(assets.graphs.map(function (graphId) {
+                var animated = assets.frames.indexOf(graphId) !== -1;
+                var name = graphId + '-' + (animated ? 'frames' : view.year);
+                return fetch(assets.url + name + '.json').then(function (response) {
+                    if (!response.ok) {
+                        throw new Error(name + ': HTTP ' + response.status);
+                    }
+                    return response.json();
+                }).then(function (figure) {
+                    return animated ? showFrame(figure, view.year) || figure : figure;
+                });
+            })).then(function (figures) {
+                if (view.route !== latestRoute) {
+                    throw window.dash_clientside.PreventUpdate;
+                }
+                assets.graphs.forEach(function (graphId) { markStale(graphId, false); });
+                var signatures = signed.map(function (graphId) {
+                    return assets.signatures[graphId][String(view.year)];
+                });
+                return figures.concat(signatures, noFilterUpdates);
+            }, function () {
+                if (view.route !== latestRoute) {
+                    throw window.dash_clientside.PreventUpdate;
+                }
+                // Let the figure callbacks build the view instead
+                showingPrerendered = false;
+                return assets.graphs.map(function () { return noUpdate; })
+                    .concat(signed.map(function () { return noUpdate; }), [year, regions, countries, range]);
+            });
+        },
+
+        // Start watching which graphs are in view; every change clicks the hidden
+        // graph-visibility button, which calls this again to report them
+        watchGraphVisibility: function (nClicks, graphIds) {
+            if (!nClicks) {
+                observeGraphs(graphIds);
+            }
+            return visibleGraphs === null ? window.dash_clientside.no_update : visibleGraphs;
+        },
+
+        // Pass the filters on to one graph's callbacks while it is in view. Out of
+        // view it keeps its old figure, dimmed as stale, and catches up once it scrolls in.
+        forwardGraphFilters: function (year, regions, countries, range, visible, graphId) {
+            var noUpdate = window.dash_clientside.no_update;
+            var filters = [year, regions, countries, range];
+            var last = forwardedFilters[graphId];
+            if (showingPrerendered) {
+                // The pre-rendered files bring every graph up to date
+                return [noUpdate, noUpdate, noUpdate, noUpdate];
+            }
+            if (!visible || visible.indexOf(graphId) === -1) {
+                markStale(graphId, !sameValue(filters, last));
+                return [noUpdate, noUpdate, noUpdate, noUpdate];
+            }
+            markStale(graphId, false);
+            forwardedFilters[graphId] = filters;
+            return filters.map(function (value, index) {
+                return last && sameValue(value, last[index]) ? noUpdate : value;
+            });
+        },
+
+        // Add the regions of the selected countries to the region selection,
+        // from the country -> region table shipped with the page
+        regionsForCountries: function (selectedCountries, currentRegions, countryRegions) {
+            if (!selectedCountries || !selectedCountries.length) {
+                return window.dash_clientside.no_update;
+            }
+            var regions = (currentRegions || []).slice();
+            var added = false;
+            selectedCountries.forEach(function (country) {
+                var region = (countryRegions || {})[country];
+                if (region !== undefined && regions.indexOf(region) === -1) {
+                    regions.push(region);
+                    added = true;
+                }
+            });
+            // Leave the selector alone (and its dependents idle) when nothing is new
+            return added ? regions : window.dash_clientside.no_update;
+        }
+    }
+});
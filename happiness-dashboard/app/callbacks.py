@@ -1,109 +1,272 @@
 from dash.dependencies import Input, Output , State,  MATCH
-from dash import callback, Input, Output, State
+from dash import ClientsideFunction, ctx, no_update, Input, Output, State
+from app.figure_cache import normalize_range, normalize_selection
+from app.figure_frames import show_year
+from app.figure_patch import figure_patch, figure_signature
+from app.serialization import compact_figure
+
+# Builder of each dashboard figure on HappinessDashboard
+FIGURE_BUILDERS = {
+    'world-map': 'create_world_map',
+    'scatter-plot': 'create_scatter_plot',
+    'bar-chart': 'create_bar_chart',
+    'regional-trends': 'create_country_trends',
+    'pie-chart': 'create_pie_chart',
+}
+
+# Figures that animation mode sends with a frame per year
+ANIMATED_FIGURES = ('world-map', 'scatter-plot', 'bar-chart')
+
+# Filter selectors, and the stores that forward them to the figure callbacks
+# when unfiltered views are served as pre-rendered files (app/figure_assets.py)
+FILTER_SELECTORS = ['year-selector', 'region-selector', 'country-selector', 'happiness-range']
+SERVER_FILTERS = ['server-year', 'server-regions', 'server-countries', 'server-range']
+
+
+def graph_filter_ids(graph_id):
+    """Stores that hand one graph its filters in lazy mode, only while it is in view."""
+    return [f'{graph_id}-{name}' for name in ('year', 'regions', 'countries', 'range')]
+
+
+def apply_filters(view, year, regions, countries, happiness_range, animate=False):
+    # Shared filtering step: canonical selections plus the countries that
+    # pass the year, region and happiness range filters when none are picked.
+    # Rows are filtered with the range as set; only the cache keys round it
+    state = {
+        'year': year,
+        'animate': animate,
+        'regions': regions,
+        'countries': countries,
+        'happiness_range': happiness_range,
+        'regions_key': normalize_selection(regions),
+        'countries_key': normalize_selection(countries),
+        'range_key': normalize_range(happiness_range),
+    }
+    if countries:
+        state['selected_countries'] = countries
+    else:
+        filtered_rows = view.engine.rows(year, regions, score_range=happiness_range)
+        state['selected_countries'] = view.engine.countries_in(filtered_rows)
+    return state
+
+
+def figure_request(graph_id, state):
+    """Cache key, builder and builder arguments of one figure for a filter state."""
+    year, regions, countries = state['year'], state['regions'], state['countries']
+    builder_name = FIGURE_BUILDERS[graph_id]
+    if state.get('animate') and graph_id in ANIMATED_FIGURES:
+        # One bundle with every year per filter; the year only picks the frame shown
+        key = (graph_id, 'frames', state['regions_key'], state['countries_key'], state['range_key'])
+        return key, 'create_year_frames', (builder_name, None, regions, countries, state['happiness_range'])
+    if graph_id == 'regional-trends':
+        # Year and range only matter when they decide the default country list
+        if countries:
+            key = (graph_id, state['regions_key'], state['countries_key'])
+        else:
+            key = (graph_id, year, state['regions_key'], state['range_key'])
+        return key, builder_name, (regions, state['selected_countries'])
+    if graph_id == 'pie-chart':
+        # Regions and range only matter when they decide the default country list
+        if countries:
+            key = (graph_id, year, tuple(countries[:3]))
+        else:
+            key = (graph_id, year, state['regions_key'], state['range_key'])
+        return key, builder_name, (year, state['selected_countries'])
+    # Map, scatter and bar depend on every filter, including the happiness range
+    key = (graph_id, year, state['regions_key'], state['countries_key'], state['range_key'])
+    return key, builder_name, (year, regions, countries, state['happiness_range'])
+
+
+def cached_figure(figure_cache, view, graph_id, state, record=True, figure_pool=None):
+    key, builder_name, args = figure_request(graph_id, state)
+    if figure_pool is not None:
+        build = lambda: figure_pool.build(view, builder_name, args)  # noqa: E731
+    else:
+        build = lambda: compact_figure(getattr(view, builder_name)(*args))  # noqa: E731
+    return figure_cache.get_or_build(key, build, view.data_version, record)
+
+
+def register_callbacks(app, dashboard, figure_cache, patch_updates=True, figure_pool=None, animate_years=False,
+                       prerendered=False, lazy=False):
+    if prerendered:
+        # Only filtered views reach the figure callbacks, via routeFigureRequest
+        source_ids, source_prop = SERVER_FILTERS, 'data'
+        register_prerendered_callbacks(app, patch_updates and not animate_years)
+    else:
+        source_ids, source_prop = FILTER_SELECTORS, 'value'
+    if lazy:
+        # Each graph gets its own copy of the filters, passed on only while it is in view
+        register_lazy_callbacks(app, source_ids, source_prop)
+    filter_prop = 'data' if lazy else source_prop
+    prevent_initial_call = prerendered or lazy
+
+    def filter_ids(graph_id):
+        return graph_filter_ids(graph_id) if lazy else source_ids
+
+    def filter_inputs(graph_id):
+        return [Input(component_id, filter_prop) for component_id in filter_ids(graph_id)]
+
+    def triggered_only_by(*component_ids):
+        # True when every input that changed is one the figure does not depend on
+        triggered = ctx.triggered_prop_ids.values()
+        return bool(triggered) and all(component_id in component_ids for component_id in triggered)
+
+    def register_year_figure(graph_id):
+        def build(year, regions, countries, happiness_range):
+            # Work on one consistent dataset even if a reload swaps it meanwhile
+            view = dashboard.snapshot()
+            state = apply_filters(view, year, regions, countries, happiness_range)
+            return cached_figure(figure_cache, view, graph_id, state, figure_pool=figure_pool)
+
+        if not patch_updates:
+            app.callback(
+                Output(graph_id, 'figure'), filter_inputs(graph_id), prevent_initial_call=prevent_initial_call
+            )(build)
+            return
+
+        # Ship the full figure once, then only the changed data arrays and title
+        # for as long as the figure keeps the same structure in the browser
+        @app.callback(
+            [Output(graph_id, 'figure'), Output(f'{graph_id}-signature', 'data')],
+            filter_inputs(graph_id),
+            [State(f'{graph_id}-signature', 'data')],
+            prevent_initial_call=prevent_initial_call
+        )
+        def update_year_figure(year, regions, countries, happiness_range, rendered_signature):
+            figure = build(year, regions, countries, happiness_range)
+            signature = figure_signature(figure)
+            if signature == rendered_signature:
+                return figure_patch(figure), no_update
+            return figure, signature
+
+    def register_year_frames(graph_id):
+        # The year only decides which frame is shown, so a year change stays in the browser
+        @app.callback(
+            Output(graph_id, 'figure'),
+            filter_inputs(graph_id)[1:],
+            [State(filter_ids(graph_id)[0], filter_prop)],
+            prevent_initial_call=prevent_initial_call
+        )
+        def update_year_frames(regions, countries, happiness_range, year):
+            view = dashboard.snapshot()
+            state = apply_filters(view, year, regions, countries, happiness_range, animate=True)
+            return show_year(cached_figure(figure_cache, view, graph_id, state, figure_pool=figure_pool), year)
+
+        app.clientside_callback(
+            ClientsideFunction('dashboard', 'showYearFrame'),
+            Output(graph_id, 'figure', allow_duplicate=True),
+            [Input('year-selector', 'value')],
+            [State(graph_id, 'figure')],
+            prevent_initial_call=True
+        )
+
+    for graph_id in ANIMATED_FIGURES:
+        if animate_years:
+            register_year_frames(graph_id)
+        else:
+            register_year_figure(graph_id)
 
-def register_callbacks(app, dashboard):
     @app.callback(
-        [Output('world-map', 'figure'),
-         Output('scatter-plot', 'figure'),
-         Output('regional-trends', 'figure'),
-         Output('bar-chart', 'figure'),
-         Output('pie-chart', 'figure'),
-         Output('country-selector', 'options')],
-        [Input('year-selector', 'value'),
-         Input('region-selector', 'value'),
-         Input('country-selector', 'value'),
-         Input('happiness-range', 'value')]
+        Output('regional-trends', 'figure'), filter_inputs('regional-trends'), prevent_initial_call=prevent_initial_call
     )
-    def update_dashboard(year, regions, countries, happiness_range):
-        # Start with the full dataset
-        filtered_data = dashboard.data.copy()
-        
-        # Filter data based on happiness range
-        filtered_data = filtered_data[
-            (filtered_data['Happiness Score'] >= happiness_range[0]) & 
-            (filtered_data['Happiness Score'] <= happiness_range[1])
-        ]
-        
-        # Filter by year
-        filtered_data = filtered_data[filtered_data['Year'] == year]
-        
-        # Filter by regions if specified
-        if regions:
-            filtered_data = filtered_data[filtered_data['Region'].isin(regions)]
-        
-        # Update country options based on current filters
-        country_options = dashboard.get_country_options(regions)
-        
-        # If countries are specified, use them; otherwise, use all filtered countries
-        selected_countries = countries if countries else filtered_data['Country'].unique().tolist()
-        
-        # Create visualizations
-        world_map = dashboard.create_world_map(year, regions, selected_countries)
-        scatter_plot = dashboard.create_scatter_plot(year, regions, selected_countries)
-        regional_trends = dashboard.create_country_trends(regions, selected_countries)
-        bar_chart = dashboard.create_bar_chart(year, regions, selected_countries)
-        pie_chart = dashboard.create_pie_chart(year, selected_countries)
-        
-        return world_map, scatter_plot, regional_trends, bar_chart, pie_chart, country_options
+    def update_country_trends(year, regions, countries, happiness_range):
+        # Year and range only matter when they decide the default country list
+        year_id, _, _, range_id = filter_ids('regional-trends')
+        if countries and triggered_only_by(year_id, range_id):
+            return no_update
+        view = dashboard.snapshot()
+        state = apply_filters(view, year, regions, countries, happiness_range)
+        return cached_figure(figure_cache, view, 'regional-trends', state, figure_pool=figure_pool)
+
+    @app.callback(Output('pie-chart', 'figure'), filter_inputs('pie-chart'), prevent_initial_call=prevent_initial_call)
+    def update_pie_chart(year, regions, countries, happiness_range):
+        # Regions and range only matter when they decide the default country list
+        _, region_id, _, range_id = filter_ids('pie-chart')
+        if countries and triggered_only_by(region_id, range_id):
+            return no_update
+        view = dashboard.snapshot()
+        state = apply_filters(view, year, regions, countries, happiness_range)
+        return cached_figure(figure_cache, view, 'pie-chart', state, figure_pool=figure_pool)
 
     @app.callback(
+        Output('country-selector', 'options'),
+        [Input('region-selector', 'value')]
+    )
+    def update_country_options(regions):
+        return dashboard.get_country_options(regions)
+
+    # Pure UI updates run in the browser (app/assets/clientside.js)
+    app.clientside_callback(
+        ClientsideFunction('dashboard', 'regionsForCountries'),
         Output('region-selector', 'value'),
         [Input('country-selector', 'value')],
-        [State('region-selector', 'value')]
+        [State('region-selector', 'value'), State('country-regions', 'data')]
     )
-    def update_regions_based_on_countries(selected_countries, current_regions):
-        if not selected_countries:
-            return current_regions
 
-        # Get regions of selected countries
-        selected_regions = dashboard.data[dashboard.data['Country'].isin(selected_countries)]['Region'].unique().tolist()
+    app.clientside_callback(
+        ClientsideFunction('dashboard', 'selectClickedCountry'),
+        Output('country-selector', 'value'),
+        [Input('world-map', 'clickData')],
+        [State('country-selector', 'value')]
+    )
+
+def register_prerendered_callbacks(app, signed):
+    # Unfiltered views load the pre-rendered files; anything else is forwarded
+    # to the figure callbacks through the server-* stores
+    app.clientside_callback(
+        ClientsideFunction('dashboard', 'routeFigureRequest'),
+        [Output(component_id, 'data') for component_id in SERVER_FILTERS] + [Output('prerendered-view', 'data')],
+        [Input(component_id, 'value') for component_id in FILTER_SELECTORS],
+        [State(component_id, 'data') for component_id in SERVER_FILTERS]
+        + [State('prerendered-view', 'data'), State('figure-assets', 'data')]
+    )
+
+    signatures = [f'{graph_id}-signature' for graph_id in ANIMATED_FIGURES] if signed else []
+    app.clientside_callback(
+        ClientsideFunction('dashboard', 'loadPrerenderedFigures'),
+        [Output(graph_id, 'figure', allow_duplicate=True) for graph_id in FIGURE_BUILDERS]
+        + [Output(component_id, 'data', allow_duplicate=True) for component_id in signatures]
+        # Fall back to the figure callbacks when a file cannot be loaded
+        + [Output(component_id, 'data', allow_duplicate=True) for component_id in SERVER_FILTERS],
+        [Input('prerendered-view', 'data')],
+        [State('figure-assets', 'data')] + [State(component_id, 'value') for component_id in FILTER_SELECTORS],
+        prevent_initial_call=True
+    )
+
+
+def register_lazy_callbacks(app, source_ids, source_prop):
+    # The browser reports which graphs are in view (watchGraphVisibility clicks
+    # the hidden graph-visibility button on every change)
+    app.clientside_callback(
+        ClientsideFunction('dashboard', 'watchGraphVisibility'),
+        Output('visible-graphs', 'data'),
+        [Input('graph-visibility', 'n_clicks')],
+        [State('lazy-graphs', 'data')]
+    )
+
+    # A graph out of view keeps its old figure and falls behind the filters
+    # (stale); it catches up as soon as it scrolls into view
+    for graph_id in FIGURE_BUILDERS:
+        app.clientside_callback(
+            ClientsideFunction('dashboard', 'forwardGraphFilters'),
+            [Output(component_id, 'data') for component_id in graph_filter_ids(graph_id)],
+            [Input(component_id, source_prop) for component_id in source_ids] + [Input('visible-graphs', 'data')],
+            [State(graph_id, 'id')]
+        )
 
-        # Combine current regions with new regions
-        if current_regions:
-            selected_regions = list(set(current_regions + selected_regions))
 
-        return selected_regions
-    @app.callback(
-    Output('country-selector', 'value'),
-    [Input('world-map', 'clickData')],
-    [State('country-selector', 'value')]
-     )
-    def update_country_selection(clickData, current_countries):
-    # Si aucun clic n'a été effectué, retournez la sélection actuelle
-     if not clickData:
-        return current_countries
-    
-    # Récupérer le nom du pays cliqué
-     clicked_country = clickData['points'][0]['location']
-    
-    # Si aucun pays n'est actuellement sélectionné, créez une nouvelle liste
-     if not current_countries:
-        return [clicked_country]
-    
-    # Si le pays est déjà sélectionné, le désélectionnez
-     if clicked_country in current_countries:
-        return [country for country in current_countries if country != clicked_country]
-    
-    # Sinon, ajoutez le pays à la sélection
-     return current_countries + [clicked_country]
 # In your main app file
 def register_sidebar_toggle_callback(app):
 
-    @callback(
-    Output("menu-sidebar", "style"),  # Output pour changer le style (visibilité)
-    Input("menu-button", "n_clicks"),  # Input : clic sur le bouton
-    State("menu-sidebar", "style")  # État actuel du style du menu
-)
-    def toggle_menu(n_clicks, current_style):
-     if n_clicks:
-        # Toggle the `transform` property
-        if current_style['transform'] == 'translateX(0)':
-            current_style['transform'] = 'translateX(-100%)'  # Cache le menu
-        else:
-            current_style['transform'] = 'translateX(0)'  # Affiche le menu
-     return current_style
-    
-    @app.callback(
+    app.clientside_callback(
+        ClientsideFunction('dashboard', 'toggleMenu'),
+        Output("menu-sidebar", "style"),  # Output pour changer le style (visibilité)
+        Input("menu-button", "n_clicks"),  # Input : clic sur le bouton
+        State("menu-sidebar", "style")  # État actuel du style du menu
+    )
+
+    app.clientside_callback(
+        ClientsideFunction('dashboard', 'toggleFilterForm'),
         [
             Output("filter-collapse", "is_open"),
             Output("filter-toggle-icon", "style"),
@@ -112,19 +275,3 @@ def register_sidebar_toggle_callback(app):
         [State("filter-collapse", "is_open")],
         prevent_initial_call=True
     )
-    def toggle_filter_form(n_clicks, is_open):
-        if n_clicks is None:
-            return True, {'cursor': 'pointer', 'transform': 'rotate(0deg)', 'transition': 'transform 0.3s ease'}
-        
-        # Toggle the collapse
-        new_is_open = not is_open
-        
-        # Rotate icon based on state
-        icon_style = {
-            'cursor': 'pointer', 
-            'transform': 'rotate(90deg)' if not new_is_open else 'rotate(0deg)',
-            'transition': 'transform 0.3s ease'
-        }
-        
-        return new_is_open, icon_style
-
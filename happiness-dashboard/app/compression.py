@@ -0,0 +1,53 @@
+"""
+Compress JSON responses (callback outputs, the layout) for browsers that
+accept it: brotli when the brotli package is installed, gzip otherwise.
+
+Figure JSON shrinks to a fifth or less. Responses that are already encoded
+(the pre-rendered figure files), streamed, small or not JSON are passed
+through. RESPONSE_COMPRESSION=0 turns it off, e.g. behind a proxy that
+compresses.
+"""
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_SIZE = 1024
+GZIP_LEVEL = 6
+# Quality 5 is close to gzip's speed for a clearly smaller body
+BROTLI_QUALITY = 5
+
+
+def compress(body, accepted):
+    """(encoding, compressed body) for an Accept-Encoding header, or (None, body)."""
+    if brotli is not None and 'br' in accepted:
+        return 'br', brotli.compress(body, quality=BROTLI_QUALITY)
+    if 'gzip' in accepted:
+        return 'gzip', gzip.compress(body, GZIP_LEVEL)
+    return None, body
+
+
+def register_compression(server):
+    if os.environ.get('RESPONSE_COMPRESSION', '1') != '1':
+        return
+
+    @server.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.status_code != 200
+                or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+            return response
+        body = response.get_data()
+        if len(body) < MIN_SIZE:
+            return response
+        encoding, compressed = compress(body, request.accept_encodings)
+        if encoding is None:
+            return response
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
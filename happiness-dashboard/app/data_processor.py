@@ -1,50 +1,220 @@
+import copy
+import threading
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objs as go
+from plotly.colors import qualitative
+from app.dataset import memory_report, read_dataset, year_hashes
+from app.figure_frames import animate_years
+from app.filter_engine import FilterEngine
+from app.geo import report_unmatched, resolve_iso3
+from app.metrics import stage
+from app.serialization import round_array, round_columns
+from app.snapshot import file_hash, load_or_build, snapshots_enabled, source_stat
+from app.stats_cube import StatsCube
+
+# plotly.express and graph_objects are imported inside the figure builders:
+# they are slow to import and nothing needs them until the first figure
+
+# Above this many countries the trends chart draws one trace per region instead
+TRENDS_MAX_COUNTRY_TRACES = 60
 
 class HappinessDashboard:
     def __init__(self, data_path):
-        # Load and preprocess data
-        self.data = pd.read_csv(data_path)
-        self.prepare_data()
+        self.data_path = data_path
+        self._swap_lock = threading.Lock()
+        self._load()
+
+    def _load(self, previous=None):
+        self.source_stat = source_stat(self.data_path)
+        self.source_hash = file_hash(self.data_path)
+        if snapshots_enabled():
+            # Map the prepared data read-only from disk so worker processes share it
+            frames, extras = load_or_build(
+                self.data_path, lambda: self._build_snapshot(previous), self.source_hash
+            )
+            self.data = frames['data']
+            self.stats = StatsCube.from_frame(frames['stats'], self.data)
+            self.derive_trends()
+            self.year_hashes = {int(year): value for year, value in extras['year_hashes'].items()}
+            self.build_indexes()
+            self.summary = extras['summary']
+        else:
+            # Load and preprocess data
+            self.data = read_dataset(self.data_path)
+            self.prepare_data(previous)
+
+        # Say up front which countries the map cannot draw
+        report_unmatched(self.data['Country'].cat.categories)
+
+        # Bumped on every (re)load so downstream caches can tell stale entries apart
+        self.data_version = getattr(self, 'data_version', 0) + 1
+
+    def _build_snapshot(self, previous=None):
+        self.data = read_dataset(self.data_path)
+        if file_hash(self.data_path) != self.source_hash:
+            # Never store content under the hash of a different version of the file
+            raise RuntimeError(f"{self.data_path} changed while it was being loaded")
+        self.prepare_data(previous)
+        frames = {
+            'data': self.data,
+            'stats': self.stats.to_frame(),
+        }
+        return frames, {
+            'year_hashes': {str(year): value for year, value in self.year_hashes.items()},
+            'summary': self.summary,
+        }
     
-    def prepare_data(self):
+    def prepare_data(self, previous=None):
+        self.year_hashes = year_hashes(self.data)
+        # Resolve map codes once instead of matching country names on every render
+        self.data['ISO3'] = resolve_iso3(self.data['Country']).array
+        if previous is not None:
+            self._prepare_incremental(previous)
+            self.build_indexes()
+            self.summary = self.summarize()
+            return
+
         # Normalize happiness scores
-        self.data['Normalized Happiness'] = (self.data['Happiness Score'] - self.data['Happiness Score'].min()) / \
-                                            (self.data['Happiness Score'].max() - self.data['Happiness Score'].min())
+        self.data['Normalized Happiness'] = ((self.data['Happiness Score'] - self.data['Happiness Score'].min()) / \
+                                            (self.data['Happiness Score'].max() - self.data['Happiness Score'].min())).astype('float32')
         
-        # Calculate global and regional trends
-        self.global_trends = self.data.groupby('Year')['Happiness Score'].mean().reset_index()
-        self.regional_insights = self.data.groupby(['Region', 'Year'])['Happiness Score'].mean().reset_index()
+        # Year x Region statistics of the score and factors, in one pass
+        self.stats = StatsCube.build(self.data)
+        self.derive_trends()
+
+        self.build_indexes()
+        self.summary = self.summarize()
+
+    def _prepare_incremental(self, previous):
+        # Years whose rows differ from the previously loaded dataset
+        changed = {year for year, value in self.year_hashes.items() if previous.year_hashes.get(year) != value}
+        changed |= set(previous.year_hashes) - set(self.year_hashes)
+
+        scores = self.data['Happiness Score']
+        score_min, score_max = scores.min(), scores.max()
+        year_rows = self.data.groupby('Year').indices
+
+        # The normalization only has to be redone everywhere if the score bounds moved
+        if (score_min, score_max) == tuple(previous.engine.score_bounds):
+            normalized = np.empty(len(self.data), dtype='float32')
+            previous_normalized = previous.data['Normalized Happiness'].to_numpy()
+            for year, rows in year_rows.items():
+                if year in changed:
+                    normalized[rows] = (scores.to_numpy()[rows] - score_min) / (score_max - score_min)
+                else:
+                    normalized[rows] = previous_normalized[previous.engine.year_rows[year]]
+            self.data['Normalized Happiness'] = normalized
+        else:
+            self.data['Normalized Happiness'] = ((scores - score_min) / (score_max - score_min)).astype('float32')
+
+        # Recompute the statistics of changed years only and keep the rest
+        self.stats = previous.stats.update(self.data, changed)
+        self.derive_trends()
+
+    def derive_trends(self):
+        # Mean score by year and by (region, year), read from the stats cube
+        self.global_trends = self.stats.table_by('Year').rename('Happiness Score').reset_index()
+        self.regional_insights = self.stats.table_by(['Region', 'Year']).rename('Happiness Score').reset_index()
+
+    def build_indexes(self):
+        # Build the query indexes used by every figure and selector
+        self.engine = FilterEngine(self.data)
+
+        # One stable color per region, whatever subset a figure shows
+        palette = qualitative.Plotly
+        self.region_colors = {
+            region: palette[i % len(palette)] for i, region in enumerate(sorted(self.engine.regions))
+        }
+
+    def source_changed(self):
+        return source_stat(self.data_path) != self.source_stat
+
+    def reload(self):
+        """
+        Load the data file again off the request path and atomically swap the
+        new state in. Aggregates are only recomputed for years that changed.
+        Returns the changed years, or None when the file content is unchanged.
+        """
+        if file_hash(self.data_path) == self.source_hash:
+            self.source_stat = source_stat(self.data_path)
+            return None
+
+        fresh = object.__new__(HappinessDashboard)
+        fresh.data_path = self.data_path
+        fresh._swap_lock = self._swap_lock
+        fresh.data_version = self.data_version
+        previous = self.snapshot()
+        fresh._load(previous=previous)
+
+        with self._swap_lock:
+            self.__dict__.update(fresh.__dict__)
+        return sorted(
+            year for year in set(fresh.year_hashes) | set(previous.year_hashes)
+            if fresh.year_hashes.get(year) != previous.year_hashes.get(year)
+        )
+
+    def snapshot(self):
+        """Consistent view of the current state that a later reload will not modify."""
+        with self._swap_lock:
+            return copy.copy(self)
     
+    def memory_report(self):
+        return memory_report(self.data)
+
+    def summarize(self):
+        """
+        Everything the page layout needs from the data: selector options and
+        info-card statistics. Computed once per dataset version and stored in
+        the snapshot, so a cold start does not recompute it.
+        """
+        stats = self.stats
+        region_means = self.regional_insights.groupby('Region')['Happiness Score'].mean()
+        return {
+            'year_options': [{'label': str(year), 'value': int(year)} for year in self.engine.years],
+            'region_options': [{'label': region, 'value': region} for region in sorted(self.engine.regions)],
+            'country_options': [{'label': country, 'value': country} for country in self.engine.sorted_countries],
+            'country_regions': {
+                country: self.engine.region_of(country) for country in self.engine.sorted_countries
+            },
+            'score_bounds': [stats.get('min'), stats.get('max')],
+            'info_cards': {
+                'total_countries': len(self.engine.countries),
+                'avg_happiness': round(stats.get('mean'), 2),
+                'top_region': str(region_means.idxmax()),
+                'recent_year': int(self.engine.years[-1]),
+            },
+        }
+
     def get_year_options(self):
-        return [{'label': str(year), 'value': year} for year in sorted(self.data['Year'].unique())]
+        return self.summary['year_options']
     
     def get_region_options(self):
-        return [{'label': region, 'value': region} for region in sorted(self.data['Region'].unique())]
+        return self.summary['region_options']
     
     def get_country_options(self, regions=None):
-        if regions:
-            filtered_countries = self.data[self.data['Region'].isin(regions)]['Country'].unique()
-        else:
-            filtered_countries = self.data['Country'].unique()
-        return [{'label': country, 'value': country} for country in sorted(filtered_countries)]
+        if not regions:
+            return self.summary['country_options']
+        filtered_countries = self.engine.country_options(regions)
+        return [{'label': country, 'value': country} for country in filtered_countries]
+
+    def get_country_regions(self):
+        return self.summary['country_regions']
+
+    def get_info_card_stats(self):
+        return self.summary['info_cards']
     
-    def create_world_map(self, year, regions=None, countries=None):
+    @stage('create_world_map')
+    def create_world_map(self, year, regions=None, countries=None, happiness_range=None):
+        import plotly.express as px
         # Filter data
-        filtered_data = self.data[self.data['Year'] == year].copy()
-        
-        if regions:
-            filtered_data = filtered_data[filtered_data['Region'].isin(regions)]
-        if countries:
-            filtered_data = filtered_data[filtered_data['Country'].isin(countries)]
+        filtered_data = round_columns(self.engine.frame(self.engine.rows(year, regions, countries, happiness_range)))
+        filtered_data = filtered_data[filtered_data['ISO3'].notna()]
         
         # Create choropleth map
         fig = px.choropleth(
             filtered_data,
-            locations="Country",
-            locationmode="country names",
+            locations="ISO3",
+            locationmode="ISO-3",
             color="Normalized Happiness",
             hover_name="Country",
             hover_data={
@@ -70,18 +240,14 @@ class HappinessDashboard:
         
         return fig
     
-    def create_scatter_plot(self, year, regions=None, countries=None):
+    @stage('create_scatter_plot')
+    def create_scatter_plot(self, year, regions=None, countries=None, happiness_range=None):
+        import plotly.express as px
             # Calculer les valeurs globales de min et max pour l'axe Y
-        global_min = self.data['Happiness Score'].min()
-        global_max = self.data['Happiness Score'].max()
+        global_min, global_max = self.engine.score_bounds
 
         # Filter data
-        filtered_data = self.data[self.data['Year'] == year].copy()
-        
-        if regions:
-            filtered_data = filtered_data[filtered_data['Region'].isin(regions)]
-        if countries:
-            filtered_data = filtered_data[filtered_data['Country'].isin(countries)]
+        filtered_data = round_columns(self.engine.frame(self.engine.rows(year, regions, countries, happiness_range)))
         
         # Create scatter plot
         fig = px.scatter(
@@ -89,6 +255,9 @@ class HappinessDashboard:
             x="Economy (GDP per Capita)", 
             y="Happiness Score",
             color="Region",
+            # Same trace order and colors every year, so a year change can be patched
+            category_orders={"Region": sorted(self.engine.regions)},
+            color_discrete_map=self.region_colors,
             size="Health (Life Expectancy)",
             hover_name="Country",
             hover_data={
@@ -111,64 +280,86 @@ class HappinessDashboard:
         
         return fig
     
+    @stage('create_country_trends')
     def create_country_trends(self, regions=None, countries=None):
+        import plotly.graph_objs as go
         # Calculate global min and max values for the Y-axis
-        global_min = self.data['Happiness Score'].min() - 0.5
-        global_max = self.data['Happiness Score'].max() + 0.5
-
-        # Filter data based on selected regions
-        if regions:
-            filtered_data = self.data[self.data['Region'].isin(regions)]
-        else:
-            filtered_data = self.data
-
-        # Filter data based on selected countries
-        if countries:
-            filtered_data = filtered_data[filtered_data['Country'].isin(countries)]
+        global_min, global_max = self.engine.score_bounds
+        global_min, global_max = global_min - 0.5, global_max + 0.5
 
-        # Group by country and year
-        country_insights = filtered_data.groupby(['Country', 'Year', 'Region'])['Happiness Score'].mean().reset_index()
+        # Filter data based on selected regions and countries
+        rows = self.engine.rows(regions=regions, countries=countries)
 
-        # Filter years to 2015 to 2019
-        country_insights = country_insights[country_insights['Year'].between(2015, 2019)]
+        # Sort once by country name then year and cut the rows into one run per country
+        country_codes = self.engine.country_codes[rows]
+        order = np.lexsort((self.engine.row_years[rows], self.engine.country_sort_rank[country_codes]))
+        rows, country_codes = rows[order], country_codes[order]
+        years = self.engine.row_years[rows].astype(int)
+        scores = round_array(self.engine.scores[rows], 'Happiness Score')
+        starts = np.flatnonzero(np.r_[len(rows) > 0, country_codes[1:] != country_codes[:-1]])
+        bounds = list(zip(starts, np.r_[starts[1:], len(rows)]))
+        series_codes = country_codes[starts]
+        series_regions = self.engine.country_region_codes[series_codes]
 
-        # Ensure 'Year' is integer type
-        country_insights['Year'] = country_insights['Year'].astype(int)
-
-        # Create a color mapping for regions
-        unique_regions = country_insights['Region'].unique()
-        color_map = {region: px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)] for i, region in
-                     enumerate(unique_regions)}
-
-        # Apply color mapping to countries based on their regions
-        country_insights['Color'] = country_insights['Region'].map(color_map)
-
-        # Create line plot with markers
-        fig = px.line(
-            country_insights,
-            x='Year',
-            y='Happiness Score',
-            color='Country',
-            title='Country Happiness Trends',
-            markers=True,
-            hover_data = {'Region': True}
-        )
-
-        # Update traces to use the color mapping
-        for trace in fig.data:
-            country = trace.name
-            region = country_insights[country_insights['Country'] == country]['Region'].values[0]
-            trace.line.color = color_map[region]
+        if len(bounds) <= TRENDS_MAX_COUNTRY_TRACES:
+            # One WebGL trace per country, colored by its region
+            traces = []
+            for (start, stop), code, region_code in zip(bounds, series_codes, series_regions):
+                country, region = self.engine.countries[code], self.engine.regions[region_code]
+                color = self.region_colors[region]
+                traces.append(go.Scattergl(
+                    x=years[start:stop],
+                    y=scores[start:stop],
+                    mode='lines+markers',
+                    name=country,
+                    legendgroup=country,
+                    line=dict(color=color),
+                    marker=dict(color=color, symbol='circle'),
+                    hovertemplate=f'Country={country}<br>Year=%{{x}}<br>Happiness Score=%{{y}}'
+                                  f'<br>Region={region}<extra></extra>'
+                ))
+            legend_title = 'Country'
+        else:
+            # Too many series for one trace each: one trace per region, with a
+            # gap (NaN) between consecutive countries so their lines stay apart
+            traces = []
+            for region_code in pd.unique(series_regions):
+                region = self.engine.regions[region_code]
+                runs = [bounds[i] for i in np.flatnonzero(series_regions == region_code)]
+                index = np.concatenate([np.r_[np.arange(start, stop), -1] for start, stop in runs])
+                gaps = index < 0
+                x = np.where(gaps, np.nan, years[index])
+                y = np.where(gaps, np.nan, scores[index])
+                names = np.asarray(self.engine.countries, dtype=object)[country_codes[index]]
+                names[gaps] = None
+                traces.append(go.Scattergl(
+                    x=x,
+                    y=y,
+                    text=names,
+                    mode='lines+markers',
+                    name=region,
+                    line=dict(color=self.region_colors[region], width=1),
+                    marker=dict(color=self.region_colors[region], size=3),
+                    connectgaps=False,
+                    hovertemplate=f'Country=%{{text}}<br>Year=%{{x}}<br>Happiness Score=%{{y}}'
+                                  f'<br>Region={region}<extra></extra>'
+                ))
+            legend_title = 'Region'
 
+        first_year, last_year = self.engine.years[0], self.engine.years[-1]
+        fig = go.Figure(data=traces)
         fig.update_layout(
+            title='Country Happiness Trends',
             template='plotly_white',
             xaxis=dict(
+                title='Year',
                 tickmode='linear',
                 dtick=1,
                 tickformat='d',
-                range=[2014.8, 2019.2]
+                range=[first_year - 0.2, last_year + 0.2]
             ),
             yaxis=dict(
+                title='Happiness Score',
                 range=[global_min, global_max],
                 dtick=0.5,
                 tickformat='d',
@@ -177,20 +368,17 @@ class HappinessDashboard:
                 gridwidth=1,
                 gridcolor='lightgray'
             ),
-            legend_title_text='Country',
+            legend=dict(title_text=legend_title, tracegroupgap=0),
             height=600
         )
 
         return fig
     
-    def create_bar_chart(self, year, regions=None, countries=None):
+    @stage('create_bar_chart')
+    def create_bar_chart(self, year, regions=None, countries=None, happiness_range=None):
+     import plotly.express as px
      # Filter data
-     filtered_data = self.data[self.data['Year'] == year].copy()
-    
-     if regions:
-        filtered_data = filtered_data[filtered_data['Region'].isin(regions)]
-     if countries:
-        filtered_data = filtered_data[filtered_data['Country'].isin(countries)]
+     filtered_data = round_columns(self.engine.frame(self.engine.rows(year, regions, countries, happiness_range)))
     
      # Sort countries by happiness score in descending order
      filtered_data = filtered_data.sort_values('Happiness Score', ascending=False)
@@ -224,7 +412,19 @@ class HappinessDashboard:
     
      return fig
 
+    @stage('create_year_frames')
+    def create_year_frames(self, builder_name, year=None, regions=None, countries=None, happiness_range=None):
+        """
+        The figure of builder_name for every year as one animated figure, so
+        the browser can scrub and play through the years without a request.
+        """
+        builder = getattr(self, builder_name)
+        figures = {int(y): builder(int(y), regions, countries, happiness_range) for y in self.engine.years}
+        return animate_years(figures, year)
+
+    @stage('create_pie_chart')
     def create_pie_chart(self, year, countries=None):
+        import plotly.graph_objs as go
         # If no countries selected or more than 3 countries, return empty figure
         if not countries:
             return go.Figure()
@@ -248,7 +448,7 @@ class HappinessDashboard:
         # Add pie charts for selected countries
         for i, country in enumerate(countries):
             # Filter data for specific country and year
-            country_data = self.data[(self.data['Country'] == country) & (self.data['Year'] == year)]
+            country_data = round_columns(self.engine.frame(self.engine.rows(year, countries=[country])))
 
             if not country_data.empty:
                 # Extract happiness factors
@@ -0,0 +1,106 @@
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+logger = logging.getLogger(__name__)
+
+FACTOR_COLUMNS = [
+    'Economy (GDP per Capita)',
+    'Family',
+    'Health (Life Expectancy)',
+    'Freedom',
+    'Trust (Government Corruption)',
+    'Generosity',
+]
+
+# Columns the dashboard uses and the dtype each one is stored with. The score
+# stays float64 because the happiness range filter compares against it exactly.
+SCHEMA = {
+    'Year': 'int16',
+    'Country': 'category',
+    'Region': 'category',
+    'Happiness Score': 'float64',
+    **{column: 'float32' for column in FACTOR_COLUMNS},
+}
+
+
+def category_dtypes(frame):
+    """Sorted category dictionaries for the categorical columns of a frame."""
+    return {
+        column: pd.CategoricalDtype(sorted(frame[column].dropna().unique()))
+        for column, dtype in SCHEMA.items() if dtype == 'category'
+    }
+
+
+def enforce_schema(frame, categories=None):
+    """
+    Keep only the schema columns, cast to their declared dtypes and encode the
+    categorical columns against shared category dictionaries.
+    """
+    missing = [column for column in SCHEMA if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Dataset is missing columns: {', '.join(missing)}")
+
+    frame = frame[list(SCHEMA)]
+    categories = categories or category_dtypes(frame)
+    columns = {}
+    for column, dtype in SCHEMA.items():
+        columns[column] = frame[column].astype(categories[column] if dtype == 'category' else dtype)
+    return pd.DataFrame(columns).reset_index(drop=True)
+
+
+def read_dataset(path, categories=None):
+    """Read the merged happiness CSV into the compact dashboard schema."""
+    # Parse categoricals as plain strings first so they share one dictionary
+    dtypes = {column: ('object' if dtype == 'category' else dtype) for column, dtype in SCHEMA.items()}
+    frame = pd.read_csv(path, usecols=list(SCHEMA), dtype=dtypes, engine=CSV_ENGINE)
+    frame = enforce_schema(frame, categories)
+    logger.info("Loaded %s: %d rows, %.1f KiB", path, len(frame), memory_report(frame)['total'] / 1024)
+    return frame
+
+
+def year_hashes(frame):
+    """Content hash of the schema columns for each year, to spot which years changed."""
+    row_hashes = pd.util.hash_pandas_object(frame[list(SCHEMA)], index=False).to_numpy()
+    return {
+        int(year): hashlib.sha1(row_hashes[rows].tobytes()).hexdigest()
+        for year, rows in frame.groupby('Year').indices.items()
+    }
+
+
+def memory_report(frame):
+    """Deep memory usage in bytes per column, plus the total."""
+    usage = frame.memory_usage(index=True, deep=True)
+    report = {str(column): int(size) for column, size in usage.items()}
+    report['total'] = int(usage.sum())
+    return report
+
+
+def format_memory_report(report, baseline=None):
+    lines = []
+    for column, size in report.items():
+        line = f"{column:<32}{size / 1024:>10.1f} KiB"
+        if baseline and column in baseline and baseline[column]:
+            line += f"  ({size / baseline[column]:.0%} of {baseline[column] / 1024:.1f} KiB)"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import sys
+
+    data_path = sys.argv[1] if len(sys.argv) > 1 else 'data/happiness_info.csv'
+    plain = pd.read_csv(data_path)
+    plain['Normalized Happiness'] = np.zeros(len(plain))
+    compact = read_dataset(data_path)
+    compact['Normalized Happiness'] = np.zeros(len(compact), dtype=np.float32)
+    print(f"CSV engine: {CSV_ENGINE}")
+    print(format_memory_report(memory_report(compact), memory_report(plain)))
@@ -0,0 +1,228 @@
+"""
+Build data/happiness_info.csv from the per-year World Happiness Report files.
+
+    python -m app.etl [--source ../all_data] [--output data/happiness_info.csv]
+
+Each year file is renamed to the common schema through a declarative column
+mapping, loaded in parallel and cached under a key derived from its content,
+so re-running after adding or changing one year only re-parses that year.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from app.dataset import FACTOR_COLUMNS
+from app.geo import report_unmatched
+from app.snapshot import file_hash, read_frame, write_frame
+
+logger = logging.getLogger(__name__)
+
+# Bump when the transformation changes so every cached year is rebuilt
+ETL_VERSION = 1
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOURCE = os.path.join(os.path.dirname(PROJECT_ROOT), 'all_data')
+DEFAULT_OUTPUT = os.path.join(PROJECT_ROOT, 'data', 'happiness_info.csv')
+DEFAULT_CACHE = os.path.join(PROJECT_ROOT, 'data', '.etl_cache')
+
+OUTPUT_COLUMNS = ['Year', 'Country', 'Region', 'Happiness Rank', 'Happiness Score'] + FACTOR_COLUMNS
+
+# Source header -> output column, per edition of the report
+YEAR_COLUMNS = {
+    2015: {
+        'Country': 'Country',
+        'Region': 'Region',
+        'Happiness Rank': 'Happiness Rank',
+        'Happiness Score': 'Happiness Score',
+        'Economy (GDP per Capita)': 'Economy (GDP per Capita)',
+        'Family': 'Family',
+        'Health (Life Expectancy)': 'Health (Life Expectancy)',
+        'Freedom': 'Freedom',
+        'Trust (Government Corruption)': 'Trust (Government Corruption)',
+        'Generosity': 'Generosity',
+    },
+    2017: {
+        'Country': 'Country',
+        'Happiness.Rank': 'Happiness Rank',
+        'Happiness.Score': 'Happiness Score',
+        'Economy..GDP.per.Capita.': 'Economy (GDP per Capita)',
+        'Family': 'Family',
+        'Health..Life.Expectancy.': 'Health (Life Expectancy)',
+        'Freedom': 'Freedom',
+        'Trust..Government.Corruption.': 'Trust (Government Corruption)',
+        'Generosity': 'Generosity',
+    },
+    2018: {
+        'Country or region': 'Country',
+        'Overall rank': 'Happiness Rank',
+        'Score': 'Happiness Score',
+        'GDP per capita': 'Economy (GDP per Capita)',
+        'Social support': 'Family',
+        'Healthy life expectancy': 'Health (Life Expectancy)',
+        'Freedom to make life choices': 'Freedom',
+        'Perceptions of corruption': 'Trust (Government Corruption)',
+        'Generosity': 'Generosity',
+    },
+}
+YEAR_COLUMNS[2016] = YEAR_COLUMNS[2015]
+YEAR_COLUMNS[2019] = YEAR_COLUMNS[2018]
+
+# Regions for countries that never appear in an edition that has a Region column
+REGION_OVERRIDES = {
+    'Hong Kong S.A.R., China': 'Eastern Asia',
+    'Taiwan Province of China': 'Eastern Asia',
+    'Northern Cyprus': 'Western Europe',
+    'Trinidad & Tobago': 'Latin America and Caribbean',
+    'Gambia': 'Sub-Saharan Africa',
+    'North Macedonia': 'Central and Eastern Europe',
+}
+
+
+def column_mapping(year, header):
+    """
+    Mapping for a year. Editions without an explicit entry use whichever known
+    source header each output column has in the file.
+    """
+    if year in YEAR_COLUMNS:
+        return YEAR_COLUMNS[year]
+    mapping = {}
+    for known in YEAR_COLUMNS.values():
+        for source, target in known.items():
+            if source in header and target not in mapping.values():
+                mapping[source] = target
+    return mapping
+
+
+def discover_year_files(source_dir):
+    years = {}
+    for name in os.listdir(source_dir):
+        match = re.fullmatch(r'(\d{4})\.csv', name)
+        if match:
+            years[int(match.group(1))] = os.path.join(source_dir, name)
+    return dict(sorted(years.items()))
+
+
+def load_year(year, path):
+    """Read one edition and rename it to the output schema (Region may be missing)."""
+    header = pd.read_csv(path, nrows=0).columns
+    mapping = column_mapping(year, header)
+    missing = [source for source in mapping if source not in header]
+    if missing:
+        raise ValueError(f"{path}: missing columns {', '.join(missing)}")
+
+    frame = pd.read_csv(path, usecols=list(mapping)).rename(columns=mapping)
+    frame.insert(0, 'Year', year)
+    if 'Region' not in frame.columns:
+        frame['Region'] = None
+    frame['Year'] = frame['Year'].astype('int16')
+    frame['Happiness Rank'] = frame['Happiness Rank'].astype('int16')
+    frame[FACTOR_COLUMNS + ['Happiness Score']] = frame[FACTOR_COLUMNS + ['Happiness Score']].astype('float64')
+    return frame[OUTPUT_COLUMNS]
+
+
+def _cache_key(year, path):
+    header = list(pd.read_csv(path, nrows=0).columns)
+    spec = json.dumps([ETL_VERSION, year, column_mapping(year, header)], sort_keys=True)
+    return hashlib.sha256((file_hash(path) + spec).encode('utf-8')).hexdigest()[:16]
+
+
+def load_year_cached(year, path, cache_dir):
+    """Load one edition, reusing the cached columnar copy when its input is unchanged."""
+    directory = os.path.join(cache_dir, f'{year}-{_cache_key(year, path)}')
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return year, read_frame(directory, json.load(f)), True
+
+    frame = load_year(year, path)
+    os.makedirs(directory, exist_ok=True)
+    # Store the text columns dictionary-encoded; a missing Region becomes ''
+    stored = frame.assign(Region=frame['Region'].fillna('')).astype({'Country': 'category', 'Region': 'category'})
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(write_frame(directory, 'year', stored), f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    # Drop caches of older versions of this year's file
+    for name in os.listdir(cache_dir):
+        if name.startswith(f'{year}-') and name != os.path.basename(directory):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    return year, frame, False
+
+
+def backfill_regions(frame):
+    """Fill Region from the same country's other editions, then from REGION_OVERRIDES."""
+    region = frame['Region'].replace('', None)
+    known = frame.assign(Region=region).dropna(subset=['Region'])
+    country_regions = known.groupby('Country')['Region'].agg(lambda regions: regions.mode().iloc[0])
+    region = frame['Country'].map(country_regions).fillna(frame['Country'].map(REGION_OVERRIDES))
+
+    unmatched = sorted(frame.loc[region.isna(), 'Country'].unique())
+    if unmatched:
+        raise ValueError(f"No region known for: {', '.join(unmatched)}; add them to REGION_OVERRIDES")
+    return frame.assign(Region=region)
+
+
+def fill_missing_factors(frame):
+    """Fill missing factor values with the country's mean over its other editions."""
+    means = frame.groupby('Country')[FACTOR_COLUMNS].transform('mean')
+    filled = frame[FACTOR_COLUMNS].isna().sum()
+    for column, count in filled[filled > 0].items():
+        logger.info("Filled %d missing %s value(s) from country means", count, column)
+    return frame.assign(**{column: frame[column].fillna(means[column]) for column in FACTOR_COLUMNS})
+
+
+def build(source_dir=DEFAULT_SOURCE, output_path=DEFAULT_OUTPUT, cache_dir=DEFAULT_CACHE,
+          workers=None, use_processes=False):
+    start = time.perf_counter()
+    year_files = discover_year_files(source_dir)
+    if not year_files:
+        raise FileNotFoundError(f"No <year>.csv files in {source_dir}")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        results = list(executor.map(load_year_cached, year_files, year_files.values(),
+                                    [cache_dir] * len(year_files)))
+
+    cached = [year for year, _, hit in results if hit]
+    frames = [frame.astype({'Country': object, 'Region': object}) for _, frame, _ in results]
+    merged = pd.concat(frames, ignore_index=True)
+    merged = fill_missing_factors(backfill_regions(merged))
+    report_unmatched(merged['Country'])
+    merged = merged.sort_values(['Year', 'Happiness Rank'], kind='stable')[OUTPUT_COLUMNS]
+
+    # Write next to the target and rename so readers never see a partial file
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    merged.to_csv(output_path + '.tmp', index=False)
+    os.replace(output_path + '.tmp', output_path)
+
+    logger.info(
+        "Built %s from %d editions (%d from cache: %s) in %.2fs",
+        output_path, len(year_files), len(cached), cached, time.perf_counter() - start
+    )
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--source', default=DEFAULT_SOURCE, help="directory with <year>.csv files")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help="per-year columnar cache directory")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--processes', action='store_true', help="parse years in processes instead of threads")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    build(args.source, args.output, args.cache, args.workers, args.processes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Pre-rendered figures of the unfiltered views, served as static JSON files.
+
+With no region or country picked and the full happiness range, every figure
+depends only on the year and the dataset. They are rendered once per
+dataset version into gzipped JSON files under a versioned URL:
+
+    /_figures/<version>/<graph>-<year>.json
+    /_figures/<version>/<graph>-frames.json   (animated figures, FIGURE_ANIMATION=1)
+
+which are served with an ETag and a year-long immutable Cache-Control
+header. The version changes with the data file, the figure code and the
+Plotly version, so a cached file never goes stale. In the browser a
+clientside router (app/assets/clientside.js routeFigureRequest) loads these
+files for unfiltered views; only filtered views reach the figure callbacks.
+
+    python -m app.figure_assets
+
+renders them ahead of time (the Docker build does); otherwise the app
+renders missing ones at startup and after every dataset reload.
+"""
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+from flask import Response, abort, request
+
+from app.callbacks import ANIMATED_FIGURES, FIGURE_BUILDERS, apply_filters, cached_figure
+from app.figure_patch import figure_signature
+from app.serialization import to_json
+
+logger = logging.getLogger(__name__)
+
+ASSET_FORMAT = 1
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+MAX_AGE = 365 * 24 * 3600
+
+
+def assets_root(data_path):
+    default = os.path.join(os.path.dirname(os.path.abspath(data_path)), '.figures')
+    return os.environ.get('FIGURE_ASSETS_DIR', default)
+
+
+def code_fingerprint():
+    """Hash of the code that shapes the figures, so a deploy gets new URLs."""
+    import plotly
+
+    digest = hashlib.sha256(f'{ASSET_FORMAT}:{plotly.__version__}'.encode())
+    for path in sorted(glob.glob(os.path.join(APP_DIR, '*.py'))):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class FigureAssets:
+    def __init__(self, dashboard, figure_cache, animate_years=False, patch_updates=True,
+                 figure_pool=None, url_prefix='/', directory=None):
+        self.dashboard = dashboard
+        self.figure_cache = figure_cache
+        self.animate_years = animate_years
+        self.patch_updates = patch_updates
+        self.figure_pool = figure_pool
+        self.url_prefix = url_prefix
+        self.directory = directory or assets_root(dashboard.data_path)
+        self._code = code_fingerprint()
+        self.rendered = None
+
+    def version(self, view):
+        key = f'{self._code}:{view.source_hash}:{self.animate_years}'
+        return hashlib.sha256(key.encode()).hexdigest()[:20]
+
+    def render(self):
+        """Render the current dataset's files unless they exist; returns the manifest."""
+        view = self.dashboard.snapshot()
+        version = self.version(view)
+        target = os.path.join(self.directory, version)
+        manifest = self._read_manifest(target)
+        if manifest is None:
+            manifest = self._write(view, version, target)
+        self._remove_stale(version)
+        self.rendered = manifest
+        return manifest
+
+    def _read_manifest(self, target):
+        try:
+            with open(os.path.join(target, 'manifest.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, view, version, target):
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.directory)
+        happiness_range = list(view.summary['score_bounds'])
+        years = [option['value'] for option in view.summary['year_options']]
+        animated = list(ANIMATED_FIGURES) if self.animate_years else []
+        signed = [graph_id for graph_id in ANIMATED_FIGURES if self.patch_updates and not animated]
+        signatures = {graph_id: {} for graph_id in signed}
+        files = {}
+        try:
+            for year in years:
+                state = apply_filters(view, year, None, None, happiness_range, self.animate_years)
+                for graph_id in FIGURE_BUILDERS:
+                    # An animated figure covers every year; the browser picks the frame
+                    name = f'{graph_id}-frames' if graph_id in animated else f'{graph_id}-{year}'
+                    if name in files:
+                        continue
+                    figure = cached_figure(
+                        self.figure_cache, view, graph_id, state, record=False, figure_pool=self.figure_pool
+                    )
+                    if graph_id in signed:
+                        # What the patch callbacks compare against once the figure is shown
+                        signatures[graph_id][str(year)] = figure_signature(figure)
+                    encoded = gzip.compress(to_json(figure).encode('utf-8'), 9)
+                    with open(os.path.join(staging, f'{name}.json.gz'), 'wb') as f:
+                        f.write(encoded)
+                    files[name] = len(encoded)
+            manifest = {
+                'version': version,
+                'url': f'{self.url_prefix}_figures/{version}/',
+                'years': years,
+                'range': happiness_range,
+                'graphs': list(FIGURE_BUILDERS),
+                'frames': animated,
+                'signatures': signatures,
+            }
+            with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f)
+            try:
+                os.rename(staging, target)
+            except OSError:
+                # Another process rendered the same version first
+                shutil.rmtree(staging, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        logger.info("Rendered %d figure files (%.0f KiB gzipped) for version %s",
+                    len(files), sum(files.values()) / 1024, version)
+        return self._read_manifest(target) or manifest
+
+    def _remove_stale(self, current):
+        # Keep the newest other version too: pages loaded before a reload or a
+        # deploy still ask for its files
+        versions = [
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name != current and not name.startswith('.')
+        ]
+        for path in sorted(versions, key=os.path.getmtime)[:-1]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def manifest(self, view):
+        """What the browser needs to load view's files, or None until they are rendered."""
+        if self.rendered is None or self.rendered['version'] != self.version(view):
+            return None
+        return self.rendered
+
+    def register_routes(self, server):
+        @server.route('/_figures/<version>/<name>')
+        def figure_asset(version, name):
+            if not re.fullmatch(r'[0-9a-f]+', version) or not re.fullmatch(r'[\w-]+\.json', name):
+                abort(404)
+            path = os.path.join(self.directory, version, name + '.gz')
+            etag = f'{version}-{name}'
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                try:
+                    with open(path, 'rb') as f:
+                        body = f.read()
+                except OSError:
+                    abort(404)
+                if 'gzip' in request.accept_encodings:
+                    response = Response(body, content_type='application/json')
+                    response.headers['Content-Encoding'] = 'gzip'
+                else:
+                    response = Response(gzip.decompress(body), content_type='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = f'public, max-age={MAX_AGE}, immutable'
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    os.environ.setdefault('FIGURE_WARMUP_SECONDS', '0')
+    from app.main import create_dash_app
+
+    # create_dash_app renders whatever is missing
+    app = create_dash_app()
+    print(json.dumps(app.figure_assets.rendered, indent=2) if app.figure_assets else "FIGURE_ASSETS=0")
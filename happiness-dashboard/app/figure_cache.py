@@ -0,0 +1,164 @@
+import math
+import threading
+from collections import OrderedDict
+
+from app.serialization import to_json
+
+
+def normalize_selection(values):
+    """Canonical, order-independent form of a dropdown selection."""
+    if not values:
+        return None
+    return tuple(sorted(values))
+
+
+def normalize_range(value_range, digits=3):
+    """Slider range rounded outwards, so equivalent ranges share a cache key (not for filtering)."""
+    if value_range is None:
+        return None
+    scale = 10 ** digits
+    return (math.floor(value_range[0] * scale) / scale, math.ceil(value_range[1] * scale) / scale)
+
+
+class _Flight:
+    """One in-progress build that identical lookups wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.figure = None
+        self.error = None
+
+
+class FigureCache:
+    """
+    Bounded LRU cache of built figures, limited both by entry count and by the
+    serialized size of the cached figures. The cache empties itself when it is
+    used with a newer dataset version; lookups for an older version (callbacks
+    still working on the data from before a reload) are built but not cached.
+    Concurrent misses on one key share a
+    single build; waiters give up after wait_timeout seconds and build
+    their own, and a failed build raises its error in every waiter.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=128 * 1024 * 1024, wait_timeout=30.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.RLock()
+        self._version = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.wait_timeouts = 0
+
+    def get_or_build(self, key, builder, version=None, record=True):
+        # record=False for warm-up builds, which are not lookups by a user
+        with self._lock:
+            stale = version != self._version and not self._is_newer(version)
+            if stale:
+                # Storing it would wipe the entries of the current version
+                if record:
+                    self.misses += 1
+            else:
+                if version != self._version:
+                    self._clear()
+                    self._version = version
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    if record:
+                        self.hits += 1
+                    return entry[0]
+
+                # Identical lookups that arrive while the figure is being built
+                # wait for that build instead of starting their own
+                flight = self._flights.get((version, key))
+                leader = flight is None
+                if leader:
+                    flight = self._flights[(version, key)] = _Flight()
+                    if record:
+                        self.misses += 1
+
+        if stale:
+            return builder()
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout):
+                with self._lock:
+                    self.coalesced += 1
+                if flight.error is not None:
+                    raise flight.error
+                return flight.figure
+            # The build is taking too long; do not keep this request waiting on it
+            with self._lock:
+                self.wait_timeouts += 1
+                if record:
+                    self.misses += 1
+            return self._build(key, builder, version)
+
+        try:
+            flight.figure = self._build(key, builder, version)
+            return flight.figure
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop((version, key), None)
+            flight.done.set()
+
+    def _is_newer(self, version):
+        # Dataset versions only move forward; None is an unversioned cache
+        return self._version is None or (version is not None and version > self._version)
+
+    def _build(self, key, builder, version):
+        # Build outside the lock so other keys stay available meanwhile
+        figure = builder()
+        size = getattr(figure, 'json_size', None)
+        if size is None:
+            size = len(to_json(figure))
+
+        with self._lock:
+            if version == self._version and size <= self.max_bytes:
+                self._store(key, figure, size)
+        return figure
+
+    def _store(self, key, figure, size):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= previous[1]
+        self._entries[key] = (figure, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def _clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'coalesced': self.coalesced,
+                'wait_timeouts': self.wait_timeouts,
+                'in_flight': len(self._flights),
+            }
@@ -0,0 +1,137 @@
+"""
+One figure with a Plotly frame per year, assembled from per-year figures.
+
+Plotly animates a frame by updating the figure's traces by position, so
+every frame carries the same traces in the same order (a trace that has no
+rows in a year is sent empty rather than left out, which would leave the
+previous year's points on screen). Points keep their identity through the
+animation via ids, and axes, color range and marker scale are fixed over
+all years so nothing rescales while the years play.
+"""
+import numpy as np
+
+# Per-trace data fields emptied when a trace has no rows in a year
+DATA_FIELDS = ('x', 'y', 'z', 'locations', 'customdata', 'hovertext', 'text', 'ids')
+
+
+def _values(trace, field):
+    value = trace.get(field)
+    return [] if value is None else list(np.asarray(value).ravel())
+
+
+def _numeric_range(values, padding=0.05):
+    values = np.asarray([value for value in values if value is not None], dtype=float)
+    if not len(values):
+        return None
+    low, high = float(values.min()), float(values.max())
+    pad = (high - low) * padding or 0.5
+    return [low - pad, high + pad]
+
+
+def _empty_like(trace):
+    empty = {key: value for key, value in trace.items() if key not in DATA_FIELDS}
+    for field in DATA_FIELDS:
+        if field in trace:
+            empty[field] = []
+    if isinstance(empty.get('marker'), dict) and 'size' in empty['marker']:
+        empty['marker'] = dict(empty['marker'], size=[])
+    return empty
+
+
+def _fix_axes(layout, frames):
+    traces = [trace for frame in frames for trace in frame['data']]
+    for axis in ('x', 'y'):
+        name = f'{axis}axis'
+        settings = dict(layout.get(name) or {})
+        values = [value for trace in traces for value in _values(trace, axis)]
+        if not values or settings.get('range') is not None:
+            continue
+        if isinstance(values[0], str):
+            # Categories keep the order they first appear in, across all years
+            settings.update(categoryorder='array', categoryarray=list(dict.fromkeys(values)))
+        else:
+            settings['range'] = _numeric_range(values)
+        layout[name] = settings
+
+    z = [value for trace in traces for value in _values(trace, 'z')]
+    if z and isinstance(layout.get('coloraxis'), dict):
+        layout['coloraxis'] = dict(layout['coloraxis'], cmin=float(np.nanmin(z)), cmax=float(np.nanmax(z)))
+
+    # Bubble sizes are scaled by the largest bubble; use the largest of all years
+    sizerefs = [
+        trace['marker']['sizeref'] for trace in traces
+        if isinstance(trace.get('marker'), dict) and trace['marker'].get('sizeref')
+    ]
+    if sizerefs:
+        for trace in traces:
+            if isinstance(trace.get('marker'), dict) and 'sizeref' in trace['marker']:
+                trace['marker']['sizeref'] = max(sizerefs)
+
+
+def _controls(years, active):
+    step = {'mode': 'immediate', 'frame': {'duration': 600, 'redraw': True}, 'transition': {'duration': 300}}
+    return {
+        'updatemenus': [{
+            'type': 'buttons', 'direction': 'left', 'showactive': False,
+            'x': 0.1, 'y': 0, 'xanchor': 'right', 'yanchor': 'top', 'pad': {'r': 10, 't': 70},
+            'buttons': [
+                {'label': '&#9654;', 'method': 'animate', 'args': [None, dict(step, fromcurrent=True)]},
+                {'label': '&#9724;', 'method': 'animate',
+                 'args': [[None], {'mode': 'immediate', 'frame': {'duration': 0, 'redraw': False}}]},
+            ],
+        }],
+        'sliders': [{
+            'active': active, 'x': 0.1, 'y': 0, 'len': 0.9, 'xanchor': 'left', 'yanchor': 'top',
+            'pad': {'b': 10, 't': 60}, 'currentvalue': {'prefix': 'Year: '},
+            'steps': [
+                {'label': str(year), 'method': 'animate', 'args': [[str(year)], step]} for year in years
+            ],
+        }],
+    }
+
+
+def animate_years(figures, active_year):
+    """
+    figures: {year: figure} built for the same filters. Returns a figure dict
+    showing active_year, with one frame per year.
+    """
+    years = sorted(figures)
+    per_year = {year: figures[year].to_plotly_json() for year in years}
+
+    # Every trace name seen in any year, in the order they first appear
+    templates = {}
+    for year in years:
+        for trace in per_year[year]['data']:
+            templates.setdefault(trace.get('name', ''), trace)
+
+    frames = []
+    for year in years:
+        by_name = {trace.get('name', ''): trace for trace in per_year[year]['data']}
+        data = []
+        for name, template in templates.items():
+            trace = dict(by_name[name]) if name in by_name else _empty_like(template)
+            if 'hovertext' in trace and 'locations' not in trace:
+                # Move each country's point, not whichever point had its position last year
+                trace['ids'] = trace['hovertext']
+            data.append(trace)
+        title = per_year[year]['layout'].get('title')
+        frames.append({'name': str(year), 'data': data, 'layout': {'title': title} if title else {}})
+
+    active = years.index(active_year) if active_year in figures else len(years) - 1
+    layout = dict(per_year[years[active]]['layout'])
+    _fix_axes(layout, frames)
+    layout.update(_controls(years, active))
+    return {'data': frames[active]['data'], 'layout': layout, 'frames': frames}
+
+
+def show_year(figure, year):
+    """The same animated figure, showing year's frame."""
+    names = [frame['name'] for frame in figure['frames']]
+    if str(year) not in names:
+        return figure
+    active = names.index(str(year))
+    frame = figure['frames'][active]
+    layout = dict(figure['layout'], sliders=[dict(figure['layout']['sliders'][0], active=active)])
+    if frame['layout'].get('title'):
+        layout['title'] = frame['layout']['title']
+    return dict(figure, data=frame['data'], layout=layout)
@@ -0,0 +1,66 @@
+import hashlib
+import json
+
+from dash import Patch
+from plotly.utils import PlotlyJSONEncoder
+
+# Per-trace data fields that change with the filters; everything else
+# (layout, colorscales, geo config, hover templates) stays in the browser
+PATCH_FIELDS = ('x', 'y', 'z', 'locations', 'customdata', 'hovertext', 'text', 'ids')
+# sizeref scales the marker sizes to the largest one shown, so it moves with the data
+PATCH_MARKER_FIELDS = ('size', 'sizeref')
+PLACEHOLDER = '<patched>'
+
+
+def _figure_dict(figure):
+    return figure if isinstance(figure, dict) else figure.to_plotly_json()
+
+
+def figure_signature(figure):
+    """
+    Hash of everything in the figure that a patch does not update. Two figures
+    with the same signature differ only in their patchable data fields.
+    """
+    if getattr(figure, 'signature', None) is not None:
+        # Computed by the helper process that built the figure (app/figure_pool.py)
+        return figure.signature
+    figure = _figure_dict(figure)
+    skeleton = []
+    for trace in figure.get('data', []):
+        trace = {key: PLACEHOLDER if key in PATCH_FIELDS else value for key, value in trace.items()}
+        if isinstance(trace.get('marker'), dict):
+            trace['marker'] = {
+                key: PLACEHOLDER if key in PATCH_MARKER_FIELDS else value
+                for key, value in trace['marker'].items()
+            }
+        skeleton.append(trace)
+
+    layout = dict(figure.get('layout', {}))
+    if isinstance(layout.get('title'), dict):
+        layout['title'] = {key: value for key, value in layout['title'].items() if key != 'text'}
+
+    encoded = json.dumps({'data': skeleton, 'layout': layout}, cls=PlotlyJSONEncoder, sort_keys=True)
+    return hashlib.md5(encoded.encode('utf-8')).hexdigest()
+
+
+def figure_patch(figure):
+    """Patch that turns any figure with the same signature into this one."""
+    if getattr(figure, 'patch', None) is not None:
+        # Already encoded by the helper process that built the figure
+        return figure.patch
+    figure = _figure_dict(figure)
+    patch = Patch()
+    for index, trace in enumerate(figure.get('data', [])):
+        for field in PATCH_FIELDS:
+            if field in trace:
+                patch['data'][index][field] = trace[field]
+        marker = trace.get('marker')
+        if isinstance(marker, dict):
+            for field in PATCH_MARKER_FIELDS:
+                if field in marker:
+                    patch['data'][index]['marker'][field] = marker[field]
+
+    title = figure.get('layout', {}).get('title', {})
+    if isinstance(title, dict) and 'text' in title:
+        patch['layout']['title']['text'] = title['text']
+    return patch
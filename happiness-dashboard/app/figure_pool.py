@@ -0,0 +1,143 @@
+"""
+Build figures in a pool of helper processes.
+
+The figure callbacks are separate requests that the browser sends together,
+but inside one worker their threads take turns on the GIL, so building the
+five figures of a dashboard update costs roughly their sum. With
+FIGURE_BUILD_MODE=process each worker hands its figure builds to
+FIGURE_PROCESSES helper processes (default: one per CPU, at most five) and
+the builds run in parallel on a multi-core host.
+
+Helpers load the same dataset themselves (from the snapshot when there is
+one) and send the figure back already serialized, together with its
+signature and patch (app/figure_patch.py). The worker writes that JSON into
+the response as it is, without decoding and encoding it again, and only
+decodes it if something reads the figure itself (animation frames); the
+JSON length doubles as the figure cache's size. A build falls back to the
+calling thread if the helpers died or hold a different version of the data
+file; errors raised by a builder are raised as usual.
+FIGURE_BUILD_MODE=serial (the default) builds everything in the calling
+thread.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.figure_patch import figure_patch, figure_signature
+from app.metrics import stage
+from app.serialization import RawJSON, compact_figure, to_json
+
+logger = logging.getLogger(__name__)
+
+
+class StaleData(Exception):
+    pass
+
+
+class SerializedFigure(RawJSON, Mapping):
+    """
+    Figure JSON from a helper, sent to the browser as it is. Reading it as a
+    mapping decodes it once; json_size is the length of the JSON.
+    """
+
+    def __init__(self, encoded, signature=None, patch=None):
+        super().__init__(encoded)
+        self.json_size = len(encoded)
+        self.signature = signature
+        self.patch = None if patch is None else RawJSON(patch)
+        self._figure = None
+
+    def to_plotly_json(self):
+        if self._figure is None:
+            self._figure = super().to_plotly_json()
+        return self._figure
+
+    def __getitem__(self, key):
+        return self.to_plotly_json()[key]
+
+    def __iter__(self):
+        return iter(self.to_plotly_json())
+
+    def __len__(self):
+        return len(self.to_plotly_json())
+
+
+# The helper process's own copy of the dashboard
+_dashboard = None
+
+
+def _start_helper(data_path):
+    global _dashboard
+    from app.data_processor import HappinessDashboard
+
+    _dashboard = HappinessDashboard(data_path)
+
+
+def _build(source_hash, builder_name, args):
+    if _dashboard.source_hash != source_hash:
+        _dashboard.reload()
+        if _dashboard.source_hash != source_hash:
+            raise StaleData(f"helper has {_dashboard.source_hash}, caller wants {source_hash}")
+    figure = compact_figure(getattr(_dashboard, builder_name)(*args))
+    # The patch callbacks need these; computing them here keeps the worker from decoding the figure
+    patch = to_json(figure_patch(figure)).encode('utf-8')
+    return to_json(figure).encode('utf-8'), figure_signature(figure), patch
+
+
+class FigurePool:
+    def __init__(self, data_path, processes=None):
+        self.data_path = data_path
+        self.processes = int(os.environ.get('FIGURE_PROCESSES', min(5, os.cpu_count() or 1))
+                             if processes is None else processes)
+        self._executor = None
+        self._pid = None
+        self.broken_pid = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        # Helpers belong to the process that started them, so a forked worker starts its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_start_helper,
+                    initargs=(self.data_path,)
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    @stage('figure_pool')
+    def build(self, view, builder_name, args):
+        if self.broken_pid == os.getpid():
+            return compact_figure(getattr(view, builder_name)(*args))
+        try:
+            encoded, signature, patch = self.executor().submit(
+                _build, view.source_hash, builder_name, args
+            ).result()
+        except StaleData:
+            # The data file moved on again; this caller's view is older than the helpers'
+            return compact_figure(getattr(view, builder_name)(*args))
+        except BrokenProcessPool:
+            # Do not keep respawning helpers that cannot start; build here from now on
+            logger.exception("Figure helper processes died; building figures in process %s", os.getpid())
+            self.broken_pid = os.getpid()
+            return compact_figure(getattr(view, builder_name)(*args))
+        return SerializedFigure(encoded, signature, patch)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._executor.shutdown()
+            self._executor, self._pid = None, None
+
+
+def figure_pool_from_env(data_path):
+    """A FigurePool when FIGURE_BUILD_MODE=process, otherwise None (serial builds)."""
+    if os.environ.get('FIGURE_BUILD_MODE', 'serial') != 'process':
+        return None
+    return FigurePool(data_path)
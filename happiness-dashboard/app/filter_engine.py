@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+from app.metrics import stage
+
+
+class FilterEngine:
+    """
+    Indexed lookups over the dashboard data so that a filter costs time
+    proportional to the number of matching rows instead of the table size.
+    All queries return sorted row positions into the indexed frame.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.categorical_columns = [
+            column for column, dtype in data.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)
+        ]
+
+        # Integer-code the categorical columns once
+        self.country_codes, self.countries = pd.factorize(data['Country'])
+        self.region_codes, self.regions = pd.factorize(data['Region'])
+        self.country_lookup = {country: code for code, country in enumerate(self.countries)}
+        self.region_lookup = {region: code for code, region in enumerate(self.regions)}
+
+        years = data['Year'].to_numpy()
+        self.scores = data['Happiness Score'].to_numpy()
+        self.row_years = data['Year'].to_numpy()
+        self.all_rows = self._freeze(np.arange(self.size))
+
+        # Per-year, per-country, per-region and per-(year, region) partitions
+        self.year_rows = self._partition(years)
+        self.years = sorted(self.year_rows)
+        self.country_rows = self._partition(self.country_codes)
+        self.region_rows = self._partition(self.region_codes)
+        self.year_region_rows = self._partition(
+            list(zip(years.tolist(), self.region_codes.tolist()))
+        )
+
+        # (Country, Year) -> row position
+        self.country_year_index = {
+            (code, year): row
+            for row, (code, year) in enumerate(zip(self.country_codes.tolist(), years.tolist()))
+        }
+
+        # Region of each country (first occurrence wins)
+        self.country_region_codes = np.empty(len(self.countries), dtype=self.region_codes.dtype)
+        self.country_region_codes[self.country_codes[::-1]] = self.region_codes[::-1]
+
+        # Scores sorted per year (and overall) for binary-search range queries
+        self.score_index = {None: self._sorted_scores(self.all_rows)}
+        all_scores = self.score_index[None][0]
+        self.score_bounds = (all_scores[0], all_scores[-1]) if self.size else (np.nan, np.nan)
+        for year, rows in self.year_rows.items():
+            self.score_index[year] = self._sorted_scores(rows)
+
+        # Sorted country names per region for the selector options
+        self.sorted_countries = sorted(self.countries)
+        self.country_sort_rank = np.empty(len(self.countries), dtype=np.intp)
+        self.country_sort_rank[np.argsort(np.asarray(self.countries, dtype=object))] = np.arange(len(self.countries))
+        self.sorted_countries_by_region = {
+            region: sorted(self.countries[np.unique(self.country_codes[rows])])
+            for region, rows in self.region_rows.items()
+        }
+
+    @staticmethod
+    def _freeze(rows):
+        rows.flags.writeable = False
+        return rows
+
+    def _partition(self, keys):
+        codes, uniques = pd.factorize(pd.Series(keys) if isinstance(keys, list) else keys)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        return {
+            uniques[codes[chunk[0]]]: self._freeze(chunk)
+            for chunk in np.split(order, bounds) if len(chunk)
+        }
+
+    def _sorted_scores(self, rows):
+        order = np.argsort(self.scores[rows], kind='stable')
+        return self.scores[rows][order], self._freeze(rows[order])
+
+    def _codes(self, lookup, values):
+        return [lookup[value] for value in values if value in lookup]
+
+    def _region_bitmap(self, regions):
+        bitmap = np.zeros(len(self.regions), dtype=bool)
+        bitmap[self._codes(self.region_lookup, regions)] = True
+        return bitmap
+
+    @stage('filter')
+    def rows(self, year=None, regions=None, countries=None, score_range=None):
+        """Row positions matching every given filter, in table order."""
+        empty = np.empty(0, dtype=np.intp)
+
+        if countries:
+            country_codes = self._codes(self.country_lookup, countries)
+            if year is not None:
+                rows = np.array(
+                    [self.country_year_index[(code, year)] for code in country_codes
+                     if (code, year) in self.country_year_index],
+                    dtype=np.intp
+                )
+            else:
+                rows = np.concatenate([self.country_rows[code] for code in country_codes] or [empty])
+            if regions:
+                rows = rows[self._region_bitmap(regions)[self.region_codes[rows]]]
+        elif regions:
+            region_codes = self._codes(self.region_lookup, regions)
+            if year is not None:
+                parts = [self.year_region_rows.get((year, code), empty) for code in region_codes]
+            else:
+                parts = [self.region_rows[code] for code in region_codes]
+            rows = np.concatenate(parts or [empty])
+        elif score_range is not None:
+            # Binary search on the pre-sorted scores, no masking needed
+            if year is not None and year not in self.score_index:
+                return empty
+            sorted_scores, sorted_rows = self.score_index[year]
+            start = np.searchsorted(sorted_scores, score_range[0], side='left')
+            stop = np.searchsorted(sorted_scores, score_range[1], side='right')
+            return np.sort(sorted_rows[start:stop])
+        elif year is not None:
+            return self.year_rows.get(year, empty)
+        else:
+            return self.all_rows
+
+        if score_range is not None:
+            scores = self.scores[rows]
+            rows = rows[(scores >= score_range[0]) & (scores <= score_range[1])]
+
+        return np.sort(rows)
+
+    @stage('frame')
+    def frame(self, rows):
+        """
+        Materialize only the selected rows of the indexed frame. Categorical
+        columns are decoded to plain labels because Plotly Express groups by
+        them and would otherwise trip over unobserved categories.
+        """
+        frame = self.data.take(rows)
+        for column in self.categorical_columns:
+            frame[column] = frame[column].astype(object)
+        return frame
+
+    def countries_in(self, rows):
+        """Unique country names among the given rows, in table order."""
+        return self.countries[pd.unique(self.country_codes[rows])].tolist()
+
+    def country_options(self, regions=None):
+        if not regions:
+            return self.sorted_countries
+        codes = self._codes(self.region_lookup, regions)
+        return sorted(set().union(*(self.sorted_countries_by_region[code] for code in codes)))
+
+    def regions_for(self, countries):
+        """Regions of the given countries, in order of first appearance."""
+        codes = self.country_region_codes[self._codes(self.country_lookup, countries)]
+        return self.regions[pd.unique(codes)].tolist()
+
+    def region_of(self, country):
+        return self.regions[self.country_region_codes[self.country_lookup[country]]]
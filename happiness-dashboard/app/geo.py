@@ -0,0 +1,268 @@
+"""
+Country codes and map geometry for the choropleth.
+
+Every country name in the dataset is resolved to its ISO 3166 alpha-3 code
+once, at load time, through the explicit table below, so the map never relies
+on Plotly's fuzzy "country names" matching. The world geometry Plotly draws
+is served from app/assets/topojson instead of the Plotly CDN; fetch it once
+on a machine with network access (the Docker build does this):
+
+    python -m app.geo [--base-url https://cdn.plot.ly/]
+"""
+import argparse
+import logging
+import os
+import shutil
+import urllib.request
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+COUNTRY_ISO3 = {
+    'Afghanistan': 'AFG',
+    'Albania': 'ALB',
+    'Algeria': 'DZA',
+    'Angola': 'AGO',
+    'Argentina': 'ARG',
+    'Armenia': 'ARM',
+    'Australia': 'AUS',
+    'Austria': 'AUT',
+    'Azerbaijan': 'AZE',
+    'Bahrain': 'BHR',
+    'Bangladesh': 'BGD',
+    'Belarus': 'BLR',
+    'Belgium': 'BEL',
+    'Belize': 'BLZ',
+    'Benin': 'BEN',
+    'Bhutan': 'BTN',
+    'Bolivia': 'BOL',
+    'Bosnia and Herzegovina': 'BIH',
+    'Botswana': 'BWA',
+    'Brazil': 'BRA',
+    'Bulgaria': 'BGR',
+    'Burkina Faso': 'BFA',
+    'Burundi': 'BDI',
+    'Cambodia': 'KHM',
+    'Cameroon': 'CMR',
+    'Canada': 'CAN',
+    'Central African Republic': 'CAF',
+    'Chad': 'TCD',
+    'Chile': 'CHL',
+    'China': 'CHN',
+    'Colombia': 'COL',
+    'Comoros': 'COM',
+    'Congo (Brazzaville)': 'COG',
+    'Congo (Kinshasa)': 'COD',
+    'Costa Rica': 'CRI',
+    'Croatia': 'HRV',
+    'Cyprus': 'CYP',
+    'Czech Republic': 'CZE',
+    'Denmark': 'DNK',
+    'Djibouti': 'DJI',
+    'Dominican Republic': 'DOM',
+    'Ecuador': 'ECU',
+    'Egypt': 'EGY',
+    'El Salvador': 'SLV',
+    'Estonia': 'EST',
+    'Ethiopia': 'ETH',
+    'Finland': 'FIN',
+    'France': 'FRA',
+    'Gabon': 'GAB',
+    'Gambia': 'GMB',
+    'Georgia': 'GEO',
+    'Germany': 'DEU',
+    'Ghana': 'GHA',
+    'Greece': 'GRC',
+    'Guatemala': 'GTM',
+    'Guinea': 'GIN',
+    'Haiti': 'HTI',
+    'Honduras': 'HND',
+    'Hong Kong': 'HKG',
+    'Hungary': 'HUN',
+    'Iceland': 'ISL',
+    'India': 'IND',
+    'Indonesia': 'IDN',
+    'Iran': 'IRN',
+    'Iraq': 'IRQ',
+    'Ireland': 'IRL',
+    'Israel': 'ISR',
+    'Italy': 'ITA',
+    'Ivory Coast': 'CIV',
+    'Jamaica': 'JAM',
+    'Japan': 'JPN',
+    'Jordan': 'JOR',
+    'Kazakhstan': 'KAZ',
+    'Kenya': 'KEN',
+    'Kuwait': 'KWT',
+    'Kyrgyzstan': 'KGZ',
+    'Laos': 'LAO',
+    'Latvia': 'LVA',
+    'Lebanon': 'LBN',
+    'Lesotho': 'LSO',
+    'Liberia': 'LBR',
+    'Libya': 'LBY',
+    'Lithuania': 'LTU',
+    'Luxembourg': 'LUX',
+    'Madagascar': 'MDG',
+    'Malawi': 'MWI',
+    'Malaysia': 'MYS',
+    'Mali': 'MLI',
+    'Malta': 'MLT',
+    'Mauritania': 'MRT',
+    'Mauritius': 'MUS',
+    'Mexico': 'MEX',
+    'Moldova': 'MDA',
+    'Mongolia': 'MNG',
+    'Montenegro': 'MNE',
+    'Morocco': 'MAR',
+    'Mozambique': 'MOZ',
+    'Myanmar': 'MMR',
+    'Namibia': 'NAM',
+    'Nepal': 'NPL',
+    'Netherlands': 'NLD',
+    'New Zealand': 'NZL',
+    'Nicaragua': 'NIC',
+    'Niger': 'NER',
+    'Nigeria': 'NGA',
+    'North Macedonia': 'MKD',
+    'Norway': 'NOR',
+    'Oman': 'OMN',
+    'Pakistan': 'PAK',
+    'Palestinian Territories': 'PSE',
+    'Panama': 'PAN',
+    'Paraguay': 'PRY',
+    'Peru': 'PER',
+    'Philippines': 'PHL',
+    'Poland': 'POL',
+    'Portugal': 'PRT',
+    'Puerto Rico': 'PRI',
+    'Qatar': 'QAT',
+    'Romania': 'ROU',
+    'Russia': 'RUS',
+    'Rwanda': 'RWA',
+    'Saudi Arabia': 'SAU',
+    'Senegal': 'SEN',
+    'Serbia': 'SRB',
+    'Sierra Leone': 'SLE',
+    'Singapore': 'SGP',
+    'Slovakia': 'SVK',
+    'Slovenia': 'SVN',
+    'Somalia': 'SOM',
+    'South Africa': 'ZAF',
+    'South Korea': 'KOR',
+    'South Sudan': 'SSD',
+    'Spain': 'ESP',
+    'Sri Lanka': 'LKA',
+    'Sudan': 'SDN',
+    'Suriname': 'SUR',
+    'Swaziland': 'SWZ',
+    'Sweden': 'SWE',
+    'Switzerland': 'CHE',
+    'Syria': 'SYR',
+    'Taiwan': 'TWN',
+    'Tajikistan': 'TJK',
+    'Tanzania': 'TZA',
+    'Thailand': 'THA',
+    'Togo': 'TGO',
+    'Trinidad and Tobago': 'TTO',
+    'Tunisia': 'TUN',
+    'Turkey': 'TUR',
+    'Turkmenistan': 'TKM',
+    'Uganda': 'UGA',
+    'Ukraine': 'UKR',
+    'United Arab Emirates': 'ARE',
+    'United Kingdom': 'GBR',
+    'United States': 'USA',
+    'Uruguay': 'URY',
+    'Uzbekistan': 'UZB',
+    'Venezuela': 'VEN',
+    'Vietnam': 'VNM',
+    'Yemen': 'YEM',
+    'Zambia': 'ZMB',
+    'Zimbabwe': 'ZWE',
+}
+
+# Other spellings used across editions of the report
+COUNTRY_ALIASES = {
+    'Hong Kong S.A.R., China': 'Hong Kong',
+    'Macedonia': 'North Macedonia',
+    'Taiwan Province of China': 'Taiwan',
+    'Trinidad & Tobago': 'Trinidad and Tobago',
+    'Eswatini': 'Swaziland',
+}
+
+# Reported on, but without an ISO 3166 code or their own shape in the geometry
+NO_ISO3 = {'Kosovo', 'North Cyprus', 'Northern Cyprus', 'Somaliland Region', 'Somaliland region'}
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOPOJSON_DIR = os.path.join(PROJECT_ROOT, 'app', 'assets', 'topojson')
+# Plotly's simplified (1:110m) world geometry, the file a 'world' scope map loads
+GEOMETRY_FILES = ['world_110m.json']
+PLOTLY_CDN = 'https://cdn.plot.ly/'
+
+
+def iso3(country):
+    return COUNTRY_ISO3.get(COUNTRY_ALIASES.get(country, country))
+
+
+def resolve_iso3(countries):
+    """ISO-3 code for each country name (categorical), None where there is none."""
+    names = pd.Series(countries).astype(object)
+    lookup = {name: iso3(name) for name in names.dropna().unique()}
+    return names.map(lookup).astype('category')
+
+
+def report_unmatched(countries):
+    """Log the country names that will not appear on the map; return the unknown ones."""
+    names = set(pd.Series(countries).dropna().astype(object))
+    unknown = sorted(name for name in names if iso3(name) is None and name not in NO_ISO3)
+    if unknown:
+        logger.warning("No ISO-3 code for %s; add them to COUNTRY_ISO3 or COUNTRY_ALIASES in app/geo.py",
+                       ', '.join(unknown))
+    territories = sorted(names & NO_ISO3)
+    if territories:
+        logger.info("Not drawn on the map (no ISO-3 code): %s", ', '.join(territories))
+    return unknown
+
+
+def geometry_available():
+    return all(os.path.exists(os.path.join(TOPOJSON_DIR, name)) for name in GEOMETRY_FILES)
+
+
+def topojson_url():
+    """Base URL Plotly should load geometry from, or None to keep its CDN default."""
+    if not geometry_available():
+        return None
+    import dash
+    return dash.get_asset_url('topojson/')
+
+
+def check_geometry():
+    if not geometry_available():
+        logger.warning("Map geometry is not in %s; the world map will load it from %s. "
+                       "Run python -m app.geo to bundle it.", TOPOJSON_DIR, PLOTLY_CDN)
+
+
+def fetch_geometry(base_url=PLOTLY_CDN, directory=TOPOJSON_DIR):
+    os.makedirs(directory, exist_ok=True)
+    for name in GEOMETRY_FILES:
+        target = os.path.join(directory, name)
+        with urllib.request.urlopen(base_url.rstrip('/') + '/' + name, timeout=60) as response, \
+                open(target + '.tmp', 'wb') as f:
+            shutil.copyfileobj(response, f)
+        os.replace(target + '.tmp', target)
+        logger.info("Saved %s (%.0f KiB)", target, os.path.getsize(target) / 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bundle Plotly's world geometry with the app")
+    parser.add_argument('--base-url', default=PLOTLY_CDN)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    fetch_geometry(args.base_url)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import threading
+
+from flask import jsonify
+
+# Flipped when the worker starts shutting down so load balancers stop routing to it
+_draining = threading.Event()
+
+
+def mark_draining():
+    _draining.set()
+
+
+def readiness(dashboard):
+    data = getattr(dashboard, 'data', None)
+    loaded = data is not None and len(data) > 0
+    status = {
+        'dataset_loaded': loaded,
+        'draining': _draining.is_set(),
+        'rows': len(data) if data is not None else 0,
+        'data_version': getattr(dashboard, 'data_version', None),
+    }
+    if loaded:
+        status['years'] = [int(year) for year in dashboard.engine.years]
+    status['ready'] = loaded and not _draining.is_set()
+    return status
+
+
+def register_health_routes(server, dashboard):
+    @server.route('/healthz')
+    def healthz():
+        # Liveness: the process is up and serving requests
+        return jsonify({'status': 'ok'})
+
+    @server.route('/readyz')
+    def readyz():
+        # Readiness: the dataset is loaded and the worker is not shutting down
+        status = readiness(dashboard)
+        return jsonify(status), 200 if status['ready'] else 503
@@ -1,32 +1,144 @@
+import os
 import dash
 import dash_bootstrap_components as dbc
+from app.compression import register_compression
 from app.data_processor import HappinessDashboard
+from app.figure_assets import FigureAssets
+from app.figure_cache import FigureCache
+from app.figure_pool import figure_pool_from_env
+from app.geo import check_geometry
+from app.health import register_health_routes
+from app.metrics import register_metrics
+from app.profiling import register_profiling
+from app.reloader import DatasetReloader
+from app.serialization import use_fast_json
+from app.startup import startup
+from app.warmup import FigureWarmup
 from app.visualizations import create_layout
 from app.callbacks import register_callbacks
 from app.callbacks import register_sidebar_toggle_callback
 
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'happiness_info.csv')
+
 def create_dash_app():
     # Initialize the Dash app with Bootstrap theme
-    app = dash.Dash(
-        __name__, 
-        external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME , '../frontend/assets/animate.min.css'],
-        meta_tags=[
-            {"name": "viewport", "content": "width=device-width, initial-scale=1"}
-        ]
-    )
-    register_sidebar_toggle_callback(app)
+    with startup.phase('dash app'):
+        app = dash.Dash(
+            __name__, 
+            external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME , '../frontend/assets/animate.min.css'],
+            meta_tags=[
+                {"name": "viewport", "content": "width=device-width, initial-scale=1"}
+            ]
+        )
+        register_sidebar_toggle_callback(app)
+
+        # orjson for callback responses, gzip or brotli on the wire
+        use_fast_json()
+        register_compression(app.server)
 
 
     # Set the app title
     app.title = "Global Happiness Explorer"
 
     # Initialize the dashboard
-    dashboard = HappinessDashboard('data/happiness_info.csv')
+    with startup.phase('dataset'):
+        dashboard = HappinessDashboard(os.environ.get('HAPPINESS_DATA_PATH', DATA_PATH))
+    app.dashboard = dashboard
+    check_geometry()
+
+    # Cache built figures between the callbacks and the dashboard
+    figure_cache = FigureCache(
+        max_entries=int(os.environ.get('FIGURE_CACHE_ENTRIES', 512)),
+        max_bytes=int(os.environ.get('FIGURE_CACHE_MB', 128)) * 1024 * 1024,
+        wait_timeout=float(os.environ.get('FIGURE_CACHE_WAIT_SECONDS', 30))
+    )
+    app.figure_cache = figure_cache
+
+    # FIGURE_BUILD_MODE=process builds figures in helper processes, in parallel
+    figure_pool = figure_pool_from_env(dashboard.data_path)
+    app.figure_pool = figure_pool
+
+    # FIGURE_ANIMATION=1 sends map, scatter and bar with a frame per year
+    animate_years = os.environ.get('FIGURE_ANIMATION', '0') == '1'
+
+    patch_updates = os.environ.get('FIGURE_PATCH_UPDATES', '1') == '1'
+
+    # FIGURE_ASSETS=1 (the default) serves unfiltered views as pre-rendered,
+    # browser-cacheable figure files; only filtered views reach the callbacks
+    figure_assets = None
+    if os.environ.get('FIGURE_ASSETS', '1') == '1':
+        figure_assets = FigureAssets(
+            dashboard, figure_cache, animate_years=animate_years, patch_updates=patch_updates,
+            figure_pool=figure_pool, url_prefix=app.config.requests_pathname_prefix
+        )
+        figure_assets.register_routes(app.server)
+    app.figure_assets = figure_assets
 
-    # Create the layout
-    app.layout = create_layout(dashboard)
+    # LAZY_FIGURES=1 (the default) builds a graph only while it is in view;
+    # graphs scrolled out of view catch up when they come back
+    lazy = os.environ.get('LAZY_FIGURES', '1') == '1'
+
+    # Build the layout on the first page load and again only after a reload
+    # or a new set of figure files, so new sessions pick them up
+    layouts = {}
+
+    def serve_layout():
+        view = dashboard.snapshot()
+        manifest = figure_assets.manifest(view) if figure_assets else None
+        key = (view.data_version, manifest and manifest['version'])
+        layout = layouts.get(key)
+        if layout is None:
+            layout = create_layout(view, figure_assets, lazy)
+            layouts.clear()
+            layouts[key] = layout
+        return layout
+
+    app.layout = serve_layout
 
     # Register callbacks
-    register_callbacks(app, dashboard)
+    with startup.phase('callbacks'):
+        register_callbacks(
+            app, dashboard, figure_cache,
+            patch_updates=patch_updates,
+            figure_pool=figure_pool,
+            animate_years=animate_years,
+            prerendered=figure_assets is not None,
+            lazy=lazy
+        )
+
+        # Latency, payload and cache metrics for every callback on /metrics
+        if os.environ.get('DASHBOARD_METRICS', '1') == '1':
+            register_metrics(app, figure_cache)
+
+        # Opt-in per-request profiles (PROFILE_CALLBACKS=1 or an X-Profile-Token header)
+        register_profiling(app)
+
+    # Liveness and readiness probes for the production server
+    register_health_routes(app.server, dashboard)
+
+    # Build the views most sessions start with before serving, within
+    # FIGURE_WARMUP_SECONDS (0 disables)
+    warmup = FigureWarmup(
+        dashboard, figure_cache, figure_pool=figure_pool, animate_years=animate_years,
+        prerendered=figure_assets is not None
+    )
+    with startup.phase('figure warm-up'):
+        warmup.run()
+    if figure_assets is not None:
+        with startup.phase('figure files'):
+            figure_assets.render()
+    if figure_pool is not None:
+        # Each gunicorn worker starts its own helpers after the fork
+        figure_pool.shutdown()
+    app.warmup = warmup
+
+    # Pick up a changed data file without a restart, then warm the new figures
+    listeners = [lambda _: figure_cache.invalidate(), lambda _: warmup.run()]
+    if figure_assets is not None:
+        listeners.append(lambda _: figure_assets.render())
+    reloader = DatasetReloader(dashboard, listeners=listeners)
+    reloader.register_routes(app.server)
+    app.reloader = reloader
 
+    startup.log()
     return app
\ No newline at end of file
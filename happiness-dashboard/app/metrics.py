@@ -0,0 +1,330 @@
+"""
+Request metrics in the Prometheus text format, served on /metrics.
+
+Every registered callback is timed end to end (including Dash's JSON
+serialization of its outputs) along with its response size and outcome.
+The stages inside a callback -- filtering, figure building and
+serialization -- are timed separately through the stage() decorator, and
+the figure cache's counters are exported next to them. Recording a sample
+is a perf_counter() pair and a bucket increment under a lock, cheap enough
+to leave on under load.
+
+Under gunicorn each worker keeps its own samples; with METRICS_DIR set,
+workers publish them to that directory and /metrics sums all of them, so
+any worker can answer a scrape (gunicorn.conf.py sets it up). A forked
+worker starts from zero: what the master recorded before forking (startup
+stages, figure warm-up) is published once, under the master's pid, and
+the files of exited workers are removed.
+"""
+import bisect
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+from flask import Response
+
+# Callback currently running in this thread, to label the stages inside it
+current_callback = contextvars.ContextVar('current_callback', default='')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.documentation, self.labels = name, documentation, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def reset(self):
+        self.values = {}
+        # The lock may have been held by another thread at fork time
+        self._lock = threading.Lock()
+
+    def state(self):
+        with self._lock:
+            return [[list(labels), [list(counts), total, count]] for labels, (counts, total, count) in self.values.items()]
+
+    def merge(self, merged, state):
+        for labels, (counts, total, count) in state:
+            series = merged.setdefault(tuple(labels), [[0] * len(counts), 0.0, 0])
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+            series[2] += count
+
+    def lines(self, merged):
+        for labels, (counts, total, count) in sorted(merged.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f'{self.name}_bucket{_format_labels(self.labels, labels, ("le", le))} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labels, labels)} {total}'
+            yield f'{self.name}_count{_format_labels(self.labels, labels)} {count}'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.metrics = []
+        self.collectors = []
+        self.derived = []
+        self._last_flush = 0.0
+        self._pending = None
+        # Counter values collected before the last reset, reported as zero
+        self._offsets = {}
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.metrics.append(Histogram(name, documentation, labels, buckets))
+        return self.metrics[-1]
+
+    def collector(self, collect):
+        """collect() -> [(name, kind, documentation, value)], read at each flush/scrape."""
+        self.collectors.append(collect)
+
+    def derive(self, name, documentation, compute):
+        """Gauge computed at scrape time from the summed collected values."""
+        self.derived.append((name, documentation, compute))
+
+    def _collect(self):
+        return [list(sample) for collect in self.collectors for sample in collect()]
+
+    def state(self):
+        collected = self._collect()
+        for sample in collected:
+            if sample[1] == 'counter':
+                sample[3] -= self._offsets.get(sample[0], 0)
+        return {'metrics': {metric.name: metric.state() for metric in self.metrics}, 'collected': collected}
+
+    def reset(self):
+        """Start this process's samples from zero, e.g. in a freshly forked worker."""
+        for metric in self.metrics:
+            metric.reset()
+        self._offsets = {name: value for name, kind, _, value in self._collect() if kind == 'counter'}
+        self._last_flush = 0.0
+        self._pending = None
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def publish(self):
+        """Write this process's samples for the other workers' scrapes."""
+        if not self.directory:
+            return
+        path = self._path(os.getpid())
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.state(), f)
+        os.replace(path + '.tmp', path)
+
+    def remove(self, pid):
+        """Drop the samples an exited worker published."""
+        if self.directory:
+            try:
+                os.remove(self._path(pid))
+            except FileNotFoundError:
+                pass
+
+    def flush(self, interval=1.0):
+        """Publish this process's samples for the other workers' scrapes (at most once per interval)."""
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if now - self._last_flush < interval:
+            # Publish the rest later, so an idle worker's last requests still show up
+            if self._pending is None:
+                self._pending = threading.Timer(interval, self.flush)
+                self._pending.daemon = True
+                self._pending.start()
+            return
+        self._last_flush = now
+        self._pending = None
+        self.publish()
+
+    def _states(self):
+        states = {os.getpid(): self.state()}
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                pid = name.split('.')[0]
+                if name.endswith('.json') and pid.isdigit() and int(pid) not in states:
+                    if not _alive(int(pid)):
+                        # Left behind by a worker that exited without being reaped by the master
+                        self.remove(int(pid))
+                        continue
+                    try:
+                        with open(os.path.join(self.directory, name)) as f:
+                            states[int(pid)] = json.load(f)
+                    except (OSError, ValueError):
+                        continue
+        return states.values()
+
+    def render(self):
+        states = list(self._states())
+        lines = []
+        for metric in self.metrics:
+            merged = {}
+            for state in states:
+                metric.merge(merged, state['metrics'].get(metric.name, []))
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.lines(merged))
+
+        # Collected values are summed over the workers
+        collected = {}
+        for state in states:
+            for name, kind, documentation, value in state['collected']:
+                entry = collected.setdefault(name, [kind, documentation, 0])
+                entry[2] += value
+        for name, (kind, documentation, value) in collected.items():
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+
+        totals = {name: value for name, (_, _, value) in collected.items()}
+        for name, documentation, compute in self.derived:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {compute(totals)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry(os.environ.get('METRICS_DIR'))
+
+if hasattr(os, 'register_at_fork'):
+    # The parent's samples are published once, under its own pid, instead of
+    # being copied into every child and counted once per worker
+    os.register_at_fork(before=registry.publish, after_in_child=registry.reset)
+
+callback_seconds = registry.histogram(
+    'dashboard_callback_seconds', "Callback latency, including output serialization", ('callback', 'outcome')
+)
+callback_response_bytes = registry.histogram(
+    'dashboard_callback_response_bytes', "Serialized callback response size", ('callback',), SIZE_BUCKETS
+)
+stage_seconds = registry.histogram(
+    'dashboard_stage_seconds', "Time spent in each stage of a callback", ('callback', 'stage')
+)
+
+
+def stage(name):
+    """Time the decorated function as a stage of whichever callback calls it."""
+    def decorator(function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stage_seconds.observe(time.perf_counter() - start, current_callback.get(), name)
+        return timed
+    return decorator
+
+
+def _instrument_callback(output, callback):
+    @functools.wraps(callback)
+    def instrumented(*args, **kwargs):
+        token = current_callback.set(output)
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = callback(*args, **kwargs)
+            outcome = 'ok'
+            callback_response_bytes.observe(len(response), output)
+            return response
+        except Exception as error:
+            # PreventUpdate is how a callback says "nothing to send", not a failure
+            if type(error).__name__ == 'PreventUpdate':
+                outcome = 'prevented'
+            raise
+        finally:
+            callback_seconds.observe(time.perf_counter() - start, output, outcome)
+            current_callback.reset(token)
+    return instrumented
+
+
+def _instrument_serialization():
+    # Dash serializes callback outputs with dash._callback.to_json
+    import dash._callback
+
+    to_json = dash._callback.to_json
+    if getattr(to_json, '_instrumented', False):
+        return
+    dash._callback.to_json = stage('serialize')(to_json)
+    dash._callback.to_json._instrumented = True
+
+
+def _cache_collector(figure_cache):
+    def collect():
+        stats = figure_cache.stats()
+        return [
+            ('figure_cache_hits_total', 'counter', "Figure cache hits", stats['hits']),
+            ('figure_cache_misses_total', 'counter', "Figure cache misses", stats['misses']),
+            ('figure_cache_evictions_total', 'counter', "Figure cache evictions", stats['evictions']),
+            ('figure_cache_coalesced_total', 'counter',
+             "Lookups served by waiting on an identical in-flight build (builds saved)", stats['coalesced']),
+            ('figure_cache_wait_timeouts_total', 'counter',
+             "Lookups that stopped waiting on an in-flight build and built their own", stats['wait_timeouts']),
+            ('figure_cache_entries', 'gauge', "Figures held in the cache", stats['entries']),
+            ('figure_cache_bytes', 'gauge', "Serialized size of the cached figures", stats['bytes']),
+        ]
+    return collect
+
+
+def _hit_ratio(totals):
+    lookups = totals.get('figure_cache_hits_total', 0) + totals.get('figure_cache_misses_total', 0)
+    return totals.get('figure_cache_hits_total', 0) / lookups if lookups else 0.0
+
+
+def register_metrics(app, figure_cache=None):
+    """Instrument every callback registered so far and serve /metrics."""
+    for output, entry in app.callback_map.items():
+        if 'callback' in entry:
+            entry['callback'] = _instrument_callback(output, entry['callback'])
+    _instrument_serialization()
+    if figure_cache is not None:
+        registry.collector(_cache_collector(figure_cache))
+        registry.derive('figure_cache_hit_ratio', "Share of figure lookups served from the cache", _hit_ratio)
+
+    server = app.server
+
+    @server.after_request
+    def publish_metrics(response):
+        registry.flush()
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
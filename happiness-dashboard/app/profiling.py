@@ -0,0 +1,171 @@
+"""
+On-demand profiles of single callback invocations, in production too.
+
+A callback request is profiled when PROFILE_CALLBACKS=1, or when it carries
+an X-Profile-Token header matching PROFILE_TOKEN. Only one request per
+process is profiled at a time and at most one every PROFILE_MIN_INTERVAL
+seconds (default 10); other requests run untouched. Each profile writes to
+PROFILE_DIR (default profiles/):
+
+    <time>-<pid>-<callback>.collapsed   stacks in the collapsed format read by
+                                        flamegraph.pl, speedscope and inferno
+    <time>-<pid>-<callback>.pstats      with PROFILE_MODE=cprofile instead, a
+                                        pstats dump (snakeviz, pstats)
+    <time>-<pid>-<callback>.alloc.txt   tracemalloc diff over the invocation
+
+The default PROFILE_MODE=sample samples the request thread's stack every
+PROFILE_SAMPLE_MS (default 1) from a helper thread, which keeps the overhead
+low and the stacks complete. cProfile only records caller/callee pairs, not
+whole stacks, so it gives no flamegraph; use it for exact call counts. The
+allocation diff is process wide, so
+concurrent requests in other threads show up in it. The file name is
+returned in the X-Profile-File response header.
+"""
+import collections
+import cProfile
+import hmac
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+import flask
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def write_allocation_diff(before, after, path, limit=40):
+    # Leave out the profiler's own bookkeeping
+    filters = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+    before, after = before.filter_traces(filters), after.filter_traces(filters)
+    with open(path, 'w') as f:
+        for stat in after.compare_to(before, 'lineno')[:limit]:
+            f.write(f'{stat}\n')
+
+
+class CallbackProfiler:
+    def __init__(self, directory=None, mode=None, min_interval=None, token=None, always=None, sample_ms=None):
+        env = os.environ
+        self.directory = directory or env.get('PROFILE_DIR', os.path.join(PROJECT_ROOT, 'profiles'))
+        self.mode = mode or env.get('PROFILE_MODE', 'sample')
+        self.min_interval = float(env.get('PROFILE_MIN_INTERVAL', 10) if min_interval is None else min_interval)
+        self.token = env.get('PROFILE_TOKEN') if token is None else token
+        self.always = env.get('PROFILE_CALLBACKS') == '1' if always is None else always
+        self.sample_interval = float(env.get('PROFILE_SAMPLE_MS', 1) if sample_ms is None else sample_ms) / 1000
+        self._lock = threading.Lock()
+        self._last = 0.0
+
+    def requested(self):
+        if self.always:
+            return True
+        supplied = flask.request.headers.get('X-Profile-Token', '')
+        return bool(self.token and supplied and hmac.compare_digest(supplied, self.token))
+
+    def _acquire(self):
+        # One profile at a time and no more than one per interval in this process
+        if not self._lock.acquire(blocking=False):
+            return False
+        if time.monotonic() - self._last < self.min_interval:
+            self._lock.release()
+            return False
+        self._last = time.monotonic()
+        return True
+
+    def profile(self, output, callback, args, kwargs):
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', output).strip('-')[:60]
+        base = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{slug}")
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(25)
+        before = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        try:
+            if self.mode == 'cprofile':
+                profile = cProfile.Profile()
+                try:
+                    return profile.runcall(callback, *args, **kwargs)
+                finally:
+                    profile.dump_stats(base + '.pstats')
+            with StackSampler(threading.get_ident(), self.sample_interval) as sampler:
+                try:
+                    return callback(*args, **kwargs)
+                finally:
+                    sampler.write(base + '.collapsed')
+        finally:
+            elapsed = time.perf_counter() - start
+            write_allocation_diff(before, tracemalloc.take_snapshot(), base + '.alloc.txt')
+            if started_tracing:
+                tracemalloc.stop()
+            flask.g.profile_file = os.path.basename(base)
+            logger.info("Profiled %s in %.1f ms: %s.*", output, elapsed * 1000, base)
+
+    def wrap(self, output, callback):
+        def profiled(*args, **kwargs):
+            if not self.requested() or not self._acquire():
+                return callback(*args, **kwargs)
+            try:
+                return self.profile(output, callback, args, kwargs)
+            finally:
+                self._lock.release()
+        profiled.__wrapped__ = callback
+        return profiled
+
+
+def register_profiling(app, profiler=None):
+    """Make every callback registered so far profilable on demand."""
+    profiler = profiler or CallbackProfiler()
+    if not profiler.always and not profiler.token:
+        return None
+    for output, entry in app.callback_map.items():
+        if 'callback' in entry:
+            entry['callback'] = profiler.wrap(output, entry['callback'])
+
+    @app.server.after_request
+    def profile_header(response):
+        if 'profile_file' in flask.g:
+            response.headers['X-Profile-File'] = flask.g.profile_file
+        return response
+
+    return profiler
@@ -0,0 +1,88 @@
+import hmac
+import logging
+import os
+import threading
+import time
+
+from flask import jsonify, request
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetReloader:
+    """
+    Watches the dashboard's data file from a background thread and reloads it
+    off the request path when it changes. Listeners (figure caches and the
+    like) are told after every swap.
+    """
+
+    def __init__(self, dashboard, interval=None, listeners=()):
+        self.dashboard = dashboard
+        self.interval = float(os.environ.get('DATASET_WATCH_INTERVAL', 30) if interval is None else interval)
+        self.listeners = list(listeners)
+        self.last_reload = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def reload(self):
+        # One reload at a time; concurrent triggers wait and then find nothing to do
+        with self._reload_lock:
+            start = time.perf_counter()
+            changed_years = self.dashboard.reload()
+            if changed_years is None:
+                return None
+            for listener in self.listeners:
+                listener(self.dashboard)
+            self.last_reload = {
+                'changed_years': changed_years,
+                'data_version': self.dashboard.data_version,
+                'seconds': round(time.perf_counter() - start, 3),
+            }
+            logger.info("Reloaded %s: %s", self.dashboard.data_path, self.last_reload)
+            return changed_years
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.dashboard.source_changed():
+                    self.reload()
+            except Exception:
+                logger.exception("Reloading %s failed; keeping the current dataset", self.dashboard.data_path)
+
+    def ensure_running(self):
+        """Start the watcher in this process (threads do not survive a fork)."""
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='dataset-reloader', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def register_routes(self, server, token=None):
+        token = token if token is not None else os.environ.get('ADMIN_TOKEN')
+
+        # Start the watcher lazily in whichever process ends up serving requests
+        server.before_request(self.ensure_running)
+
+        @server.route('/admin/reload', methods=['POST'])
+        def admin_reload():
+            supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+            if not token or not hmac.compare_digest(supplied, token):
+                return jsonify({'error': 'forbidden'}), 403
+            # Load in the background; the current dataset keeps serving meanwhile
+            threading.Thread(target=self._reload_logged, name='dataset-reload', daemon=True).start()
+            return jsonify({'status': 'reloading', 'data_version': self.dashboard.data_version}), 202
+
+    def _reload_logged(self):
+        try:
+            self.reload()
+        except Exception:
+            logger.exception("Reloading %s failed; keeping the current dataset", self.dashboard.data_path)
@@ -0,0 +1,225 @@
+"""
+Smaller figures and a faster JSON path for callback responses.
+
+Figures are cut down once, when they are built, and the cache keeps the
+cut-down dict:
+
+- figure data is rounded to a few decimals per column (FIGURE_PRECISION),
+  instead of float64 noise such as 7.53700017929077;
+- the Plotly template keeps only the trace defaults and subplot settings
+  of the trace types in the figure, which leaves the rendering unchanged;
+- hover columns (customdata) that repeat another per-point array of the
+  trace, e.g. the scatter's marker size, are referenced in the hover
+  template instead of sent twice.
+
+Every response then encodes the cached dict with orjson (numpy arrays
+natively) instead of Plotly's encoder, which walks and validates the
+figure again on every request. FAST_JSON=0 keeps Plotly's encoder, and
+anything orjson cannot encode falls back to it. Values that are already
+JSON (RawJSON, e.g. figures serialized by the helper processes) are
+written into the response as they are.
+"""
+import json
+import logging
+import os
+import re
+import uuid
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def parse_precision(value):
+    """'default=3,Normalized Happiness=4' -> {'default': 3, 'Normalized Happiness': 4}; 'off' -> {}."""
+    if value.strip().lower() in ('off', 'none', ''):
+        return {}
+    precision = {}
+    for item in value.split(','):
+        column, _, digits = item.rpartition('=')
+        precision[column.strip() or 'default'] = int(digits)
+    return precision
+
+
+# Decimals kept per column of figure data ('default' for the others)
+PRECISION = parse_precision(os.environ.get('FIGURE_PRECISION', 'default=3'))
+
+
+def column_precision(column, precision=None):
+    precision = PRECISION if precision is None else precision
+    return precision.get(column, precision.get('default'))
+
+
+def round_array(values, column, precision=None):
+    digits = column_precision(column, precision)
+    if digits is None or values.dtype.kind != 'f':
+        return values
+    # Round in float64: a rounded float32 still prints as 7.5370001792907715
+    return np.round(values.astype('float64'), digits)
+
+
+def round_columns(frame, precision=None):
+    """Copy of frame with every float column rounded to its precision."""
+    rounded = {
+        column: round_array(frame[column].to_numpy(), column, precision)
+        for column in frame.columns if frame[column].dtype.kind == 'f'
+    }
+    return frame.assign(**rounded) if rounded else frame
+
+
+# Template layout settings of subplots, and the trace types drawn on them
+SUBPLOT_TRACES = {
+    'geo': ('choropleth', 'scattergeo'),
+    'mapbox': ('choroplethmapbox', 'densitymapbox', 'scattermapbox'),
+    'polar': ('barpolar', 'scatterpolar', 'scatterpolargl'),
+    'ternary': ('scatterternary',),
+    'scene': ('cone', 'isosurface', 'mesh3d', 'scatter3d', 'streamtube', 'surface', 'volume'),
+}
+
+# Per-point arrays a hover template can reference instead of a customdata column
+HOVER_FIELDS = ('x', 'y', 'z', 'marker.size', 'marker.color')
+CUSTOMDATA_REF = re.compile(r'%\{customdata\[(\d+)\]')
+
+
+def _compact_template(template, types):
+    if not isinstance(template, dict):
+        return template
+    compact = dict(template)
+    if isinstance(template.get('data'), dict):
+        compact['data'] = {name: traces for name, traces in template['data'].items() if name in types}
+    if isinstance(template.get('layout'), dict):
+        unused = {key for key, users in SUBPLOT_TRACES.items() if not types.intersection(users)}
+        compact['layout'] = {key: value for key, value in template['layout'].items() if key not in unused}
+    return compact
+
+
+def _field(trace, name):
+    value = trace.get(name) if '.' not in name else (trace.get('marker') or {}).get(name.split('.')[1])
+    if value is None or isinstance(value, (str, int, float)):
+        return None
+    return np.asarray(value)
+
+
+def _dedupe_customdata(trace):
+    template = trace.get('hovertemplate')
+    if trace.get('customdata') is None or not isinstance(template, str):
+        return trace
+    columns = np.asarray(trace['customdata'], dtype=object)
+    if columns.ndim != 2:
+        return trace
+
+    fields = {name: _field(trace, name) for name in HOVER_FIELDS}
+    replacements, kept = {}, []
+    for index in range(columns.shape[1]):
+        column = columns[:, index]
+        match = next((
+            name for name, values in fields.items()
+            if values is not None and values.shape == column.shape and np.array_equal(values, column)
+        ), None)
+        if match is not None:
+            replacements[index] = '%{' + match
+        else:
+            replacements[index] = '%{customdata[' + str(len(kept)) + ']'
+            kept.append(index)
+    if len(kept) == columns.shape[1]:
+        return trace
+
+    trace = dict(trace, hovertemplate=CUSTOMDATA_REF.sub(lambda m: replacements[int(m.group(1))], template))
+    if kept:
+        trace['customdata'] = np.asarray(trace['customdata'])[:, kept]
+    else:
+        del trace['customdata']
+    return trace
+
+
+def compact_figure(figure):
+    """Figure dict without what the browser would only receive twice or not use."""
+    figure = figure if isinstance(figure, dict) else figure.to_plotly_json()
+    frames = figure.get('frames') or []
+    traces = list(figure.get('data', [])) + [trace for frame in frames for trace in frame.get('data', [])]
+    types = {trace.get('type', 'scatter') for trace in traces}
+
+    compact = dict(figure, data=[_dedupe_customdata(trace) for trace in figure.get('data', [])])
+    layout = figure.get('layout') or {}
+    if 'template' in layout:
+        compact['layout'] = dict(layout, template=_compact_template(layout['template'], types))
+    if frames:
+        compact['frames'] = [
+            dict(frame, data=[_dedupe_customdata(trace) for trace in frame.get('data', [])]) for frame in frames
+        ]
+    return compact
+
+
+class RawJSON:
+    """JSON text that to_json writes out as it is instead of encoding a value."""
+
+    def __init__(self, encoded):
+        self.encoded = encoded if isinstance(encoded, bytes) else encoded.encode('utf-8')
+
+    def to_plotly_json(self):
+        # Only for encoders that cannot take the text as it is
+        return (orjson or json).loads(self.encoded)
+
+
+# Stands in for a RawJSON value during encoding; unique so no real string matches it
+_RAW_MARKER = f'__raw_json_{uuid.uuid4().hex}_'
+_RAW_PATTERN = re.compile(rb'"' + _RAW_MARKER.encode('ascii') + rb'(\d+)"')
+
+
+def _default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'to_plotly_json'):
+        # Dash components, Patch objects and Plotly figures
+        return value.to_plotly_json()
+    raise TypeError
+
+
+def to_json(value):
+    """JSON text of value, as Plotly's encoder would write it."""
+    if orjson is not None and os.environ.get('FAST_JSON', '1') == '1':
+        raw = []
+
+        def default(value):
+            if isinstance(value, RawJSON):
+                raw.append(value.encoded)
+                return f'{_RAW_MARKER}{len(raw) - 1}'
+            return _default(value)
+
+        try:
+            encoded = orjson.dumps(
+                value, default=default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            )
+        except TypeError:
+            pass
+        else:
+            if raw:
+                encoded = _RAW_PATTERN.sub(lambda match: raw[int(match.group(1))], encoded)
+            return encoded.decode('utf-8')
+    from plotly.io.json import to_json_plotly
+
+    return to_json_plotly(value)
+
+
+def use_fast_json():
+    """Encode callback responses with to_json; metrics instrument whichever encoder is installed."""
+    import dash
+    import dash._callback
+
+    # dash._callback.to_json is private: written against Dash 2.14 (requirements.txt
+    # pins 2.14.1). Check this hook again when upgrading Dash
+    if not callable(getattr(dash._callback, 'to_json', None)):
+        logger.warning(
+            "Dash %s has no dash._callback.to_json; callback responses keep Dash's own encoder",
+            dash.__version__
+        )
+        return False
+    dash._callback.to_json = to_json
+    return True
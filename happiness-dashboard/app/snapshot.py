@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 6
+
+
+def snapshots_enabled():
+    return os.environ.get('DATASET_SNAPSHOTS', '1') == '1'
+
+
+def snapshot_root(data_path):
+    """Directory holding the binary snapshots of a source file."""
+    default = os.path.join(os.path.dirname(os.path.abspath(data_path)), '.snapshots')
+    return os.environ.get('DATASET_SNAPSHOT_DIR', default)
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_stat(path):
+    """Cheap change detector for a source file: modification time and size."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _column_file(frame_name, position):
+    return f'{frame_name}.{position}.npy'
+
+
+def write_frame(directory, frame_name, frame):
+    columns = []
+    for position, (column, values) in enumerate(frame.items()):
+        entry = {'name': column, 'file': _column_file(frame_name, position)}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            entry['categories'] = values.cat.categories.tolist()
+            array = values.cat.codes.to_numpy()
+        else:
+            array = values.to_numpy()
+        entry['dtype'] = str(array.dtype)
+        np.save(os.path.join(directory, entry['file']), np.ascontiguousarray(array), allow_pickle=False)
+        columns.append(entry)
+    return {'rows': len(frame), 'columns': columns}
+
+
+def read_frame(directory, spec):
+    columns = {}
+    for entry in spec['columns']:
+        # Read-only maps: pages come from the OS page cache and are shared by every process
+        array = np.load(os.path.join(directory, entry['file']), mmap_mode='r', allow_pickle=False)
+        if 'categories' in entry:
+            array = pd.Categorical.from_codes(array, dtype=pd.CategoricalDtype(entry['categories']))
+        columns[entry['name']] = array
+    return pd.DataFrame(columns, copy=False)
+
+
+def write_snapshot(data_path, source_hash, frames, extras=None):
+    """
+    Write the given frames as one .npy file per column into a new snapshot
+    directory named after the source hash. The directory is assembled under a
+    temporary name and renamed into place so readers never see a partial
+    snapshot.
+    """
+    root = snapshot_root(data_path)
+    os.makedirs(root, exist_ok=True)
+    target = os.path.join(root, source_hash)
+    staging = tempfile.mkdtemp(prefix='.staging-', dir=root)
+    try:
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'source': os.path.basename(data_path),
+            'source_hash': source_hash,
+            'frames': {name: write_frame(staging, name, frame) for name, frame in frames.items()},
+            'extras': extras or {},
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        if os.path.isdir(target) and read_snapshot(data_path, source_hash) is None:
+            # Left behind by an older snapshot format; it would block the rename forever
+            shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another process published the same snapshot first
+            shutil.rmtree(staging, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _remove_stale(root, keep=source_hash)
+    return target
+
+
+def _remove_stale(root, keep):
+    for name in os.listdir(root):
+        if name != keep and not name.startswith('.'):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def read_snapshot(data_path, source_hash):
+    """Memory-map the snapshot for this source hash, or return None if there is none."""
+    directory = os.path.join(snapshot_root(data_path), source_hash)
+    try:
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != SNAPSHOT_FORMAT or manifest.get('source_hash') != source_hash:
+        return None
+    frames = {name: read_frame(directory, spec) for name, spec in manifest['frames'].items()}
+    return frames, manifest.get('extras', {})
+
+
+def load_or_build(data_path, build, source_hash=None):
+    """
+    Return the prepared frames for data_path from its snapshot, rebuilding the
+    snapshot with build() -> (frames, extras) when the source file changed.
+    """
+    source_hash = source_hash or file_hash(data_path)
+    snapshot = read_snapshot(data_path, source_hash)
+    if snapshot is not None:
+        logger.info("Mapped dataset snapshot %s for %s", source_hash[:12], data_path)
+        return snapshot
+
+    frames, extras = build()
+    write_snapshot(data_path, source_hash, frames, extras)
+    logger.info("Wrote dataset snapshot %s for %s", source_hash[:12], data_path)
+    # Hand back the mapped copy so this process shares pages like every other one
+    return read_snapshot(data_path, source_hash) or (frames, extras)
+
+
+def worker_memory_report():
+    """
+    Resident memory of the current process split into shared and private
+    pages, in KiB, from /proc/self/smaps_rollup (Linux only).
+    """
+    report = {'pid': os.getpid()}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    report[parts[0].rstrip(':').lower()] = int(parts[1])
+    except OSError:
+        return report
+    report['shared'] = report.get('shared_clean', 0) + report.get('shared_dirty', 0)
+    report['private'] = report.get('private_clean', 0) + report.get('private_dirty', 0)
+    return report
+
+
+def format_memory_report(report):
+    keys = ['rss', 'pss', 'shared', 'private']
+    return f"pid {report['pid']}: " + ', '.join(
+        f"{key} {report[key] / 1024:.1f} MiB" for key in keys if key in report
+    )
+
+
+def _report_worker(data_path, use_snapshot, queue):
+    os.environ['DATASET_SNAPSHOTS'] = '1' if use_snapshot else '0'
+    from app.data_processor import HappinessDashboard
+
+    dashboard = HappinessDashboard(data_path)
+    # Touch every row like a serving worker would
+    dashboard.engine.frame(dashboard.engine.all_rows)
+    queue.put(worker_memory_report())
+
+
+if __name__ == '__main__':
+    # Compare per-worker memory with and without the shared snapshot:
+    #   python -m app.snapshot [data_path] [workers]
+    import multiprocessing
+    import sys
+
+    data_path = sys.argv[1] if len(sys.argv) > 1 else 'data/happiness_info.csv'
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    # Make sure the snapshot exists before the workers start
+    os.environ['DATASET_SNAPSHOTS'] = '1'
+    from app.data_processor import HappinessDashboard
+    HappinessDashboard(data_path)
+
+    context = multiprocessing.get_context('spawn')
+    for use_snapshot in (False, True):
+        queue = context.Queue()
+        processes = [context.Process(target=_report_worker, args=(data_path, use_snapshot, queue))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        reports = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+        print('snapshot' if use_snapshot else 'csv')
+        for report in reports:
+            print('  ' + format_memory_report(report))
+        print(f"  total private {sum(r.get('private', 0) for r in reports) / 1024:.1f} MiB")
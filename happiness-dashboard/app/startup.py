@@ -0,0 +1,81 @@
+"""
+Where cold-start time goes: named phases timed from process start.
+
+    python -m app.startup
+
+starts the app in a fresh interpreter, the way a new container or worker
+would, and prints the phase breakdown (the same report is logged at startup).
+"""
+import contextlib
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def process_age():
+    """Seconds since this process started (Linux), or None if unknown."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 is the start time in clock ticks after boot; the command
+            # name (field 2) may contain spaces, so split after it
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+
+
+class StartupReport:
+    def __init__(self):
+        self.phases = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def as_dict(self):
+        report = {name: round(seconds, 4) for name, seconds in self.phases}
+        age = process_age()
+        if age is not None:
+            report['process_age'] = round(age, 3)
+        return report
+
+    def format(self):
+        lines = [f"{name:<24}{seconds * 1000:>9.1f} ms" for name, seconds in self.phases]
+        lines.append(f"{'total (phases)':<24}{sum(s for _, s in self.phases) * 1000:>9.1f} ms")
+        age = process_age()
+        if age is not None:
+            lines.append(f"{'since process start':<24}{age * 1000:>9.0f} ms")
+        return '\n'.join(lines)
+
+    def log(self):
+        logger.info("Startup time by phase:\n%s", self.format())
+
+
+# Shared by everything that runs while the app starts up
+startup = StartupReport()
+
+
+if __name__ == '__main__':
+    import subprocess
+    import sys
+
+    # A fresh interpreter, so imports and the dataset load are really cold
+    code = (
+        "from app.startup import startup\n"
+        "with startup.phase('imports'):\n"
+        "    from app.main import create_dash_app\n"
+        "app = create_dash_app()\n"
+        "with startup.phase('first layout'):\n"
+        "    app.server.test_client().get('/_dash-layout')\n"
+        "print(startup.format())\n"
+    )
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(subprocess.call([sys.executable, '-c', code], cwd=project_root))
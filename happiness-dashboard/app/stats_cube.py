@@ -0,0 +1,310 @@
+"""
+Year x Region rollup of the happiness score and every factor column.
+
+Each cell holds count, mean, std, min, max and quartiles for one measure
+over one (Year, Region) combination; year ALL_YEARS and region ALL_REGIONS
+are the rollups over all years and all regions. Count, mean, M2 (sum of
+squared deviations from the mean), min and max of the (Year, Region) cells
+merge exactly into every rollup (Chan et al.'s parallel variance), so a
+reload only recomputes the cells of changed years from row data.
+
+Quartiles cannot be merged from other cells and need a pass over the rows,
+so they are only computed the first time one is asked for; after that a
+reload recomputes them for the changed years and the rollups.
+
+Readers go through get() and table_by() and never touch row data.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.dataset import FACTOR_COLUMNS
+
+MEASURES = ['Happiness Score'] + FACTOR_COLUMNS
+ALL_YEARS = 0
+ALL_REGIONS = '*'
+QUANTILES = {'q25': 0.25, 'q50': 0.5, 'q75': 0.75}
+STATS = ('count', 'mean', 'std', 'min', 'max') + tuple(QUANTILES)
+
+MOMENTS = ['count', 'mean', 'M2', 'min', 'max']
+_KEYS = ['Year', 'Region', 'Measure']
+
+
+def _groups(*keys):
+    # Rows sorted by their combination of (small integer) keys: the sort order,
+    # where each group starts in it and the group of every sorted row
+    combined = np.zeros(len(keys[0]), dtype='int64')
+    for key in keys:
+        key = key.astype('int64')
+        low = key.min()
+        combined = combined * (key.max() - low + 1) + (key - low)
+    order = np.argsort(combined, kind='stable')
+    combined = combined[order]
+    new = np.empty(len(combined), dtype=bool)
+    new[0] = True
+    new[1:] = combined[1:] != combined[:-1]
+    return order, np.flatnonzero(new), np.cumsum(new) - 1
+
+
+def _reduce(values, groups):
+    # Moments of the rows of values (rows x columns) in each group. Two
+    # passes, so the deviations are taken from the group mean
+    order, starts, codes = groups
+    values = values[order]
+    valid = ~np.isnan(values)
+    count = np.add.reduceat(valid, starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.add.reduceat(np.where(valid, values, 0), starts, axis=0) / count
+    deviation = np.where(valid, values - mean[codes], 0)
+    return {
+        'count': count.astype('float64'),
+        'mean': mean,
+        'M2': np.add.reduceat(deviation ** 2, starts, axis=0),
+        'min': np.fmin.reduceat(values, starts, axis=0),
+        'max': np.fmax.reduceat(values, starts, axis=0),
+    }
+
+
+def _merge(cells, groups):
+    # Merge cell moments into groups (Chan et al.):
+    # M2 = sum(M2_i) + sum(n_i * (mean_i - mean)^2)
+    order, starts, codes = groups
+    cells = {name: values[order] for name, values in cells.items()}
+    count = cells['count']
+    filled = count > 0
+    cell_mean = np.where(filled, cells['mean'], 0)
+    total = np.add.reduceat(count, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.add.reduceat(count * cell_mean, starts) / total
+    spread = np.where(filled, cells['M2'] + count * (cell_mean - mean[codes]) ** 2, 0)
+    return {
+        'count': total,
+        'mean': mean,
+        'M2': np.add.reduceat(spread, starts),
+        'min': np.fmin.reduceat(cells['min'], starts),
+        'max': np.fmax.reduceat(cells['max'], starts),
+    }
+
+
+def _concat(*parts):
+    # Cells are (keys, moments): dicts of equal-length arrays. Region and
+    # Measure keys are positions in the region and measure labels
+    return (
+        {key: np.concatenate([keys[key] for keys, _ in parts]) for key in _KEYS},
+        {name: np.concatenate([moments[name] for _, moments in parts]) for name in MOMENTS},
+    )
+
+
+def _labels(measures, *region_names):
+    regions = sorted(set().union(*region_names) - {ALL_REGIONS})
+    return {'Region': pd.Index(regions + [ALL_REGIONS], dtype=object), 'Measure': pd.Index(measures, dtype=object)}
+
+
+def _leaf_moments(data, labels):
+    measures = labels['Measure']
+    values = data[list(measures)].to_numpy(dtype='float64')
+    years = data['Year'].to_numpy().astype('int64')
+    region = data['Region'].astype('category')
+    regions = labels['Region'].get_indexer(region.cat.categories.astype(str))[region.cat.codes.to_numpy()]
+    groups = _groups(years, regions)
+    first = groups[0][groups[1]]
+    moments = _reduce(values, groups)
+    # (cells x measures) -> one cell per (Year, Region, Measure)
+    keys = {
+        'Year': np.repeat(years[first], len(measures)),
+        'Region': np.repeat(regions[first], len(measures)),
+        'Measure': np.tile(np.arange(len(measures)), len(first)),
+    }
+    return keys, {name: values.ravel() for name, values in moments.items()}
+
+
+def _rollup(cells, level, labels):
+    # Merge (Year, Region) moments over one key; that key becomes ALL_*
+    keys, moments = cells
+    other = 'Region' if level == 'Year' else 'Year'
+    groups = _groups(keys[other], keys['Measure'])
+    first = groups[0][groups[1]]
+    merged = {key: values[first] for key, values in keys.items()}
+    fill = ALL_YEARS if level == 'Year' else len(labels['Region']) - 1
+    merged[level] = np.full(len(first), fill, dtype='int64')
+    return merged, _merge(moments, groups)
+
+
+def _cells(table, labels):
+    index = table.index
+    keys = {
+        'Year': index.get_level_values('Year').to_numpy().astype('int64'),
+        'Region': labels['Region'].get_indexer(index.get_level_values('Region')),
+        'Measure': labels['Measure'].get_indexer(index.get_level_values('Measure')),
+    }
+    return keys, {name: table[name].to_numpy() for name in MOMENTS}
+
+
+def _index(keys, labels):
+    # MultiIndex straight from the key positions, with sorted levels
+    levels, codes = [], []
+    years, year_codes = np.unique(keys['Year'], return_inverse=True)
+    levels.append(years)
+    codes.append(year_codes)
+    for key in ('Region', 'Measure'):
+        order = np.argsort(labels[key].to_numpy())
+        rank = np.empty(len(order), dtype='int64')
+        rank[order] = np.arange(len(order))
+        levels.append(labels[key][order])
+        codes.append(rank[keys[key]])
+    return pd.MultiIndex(levels=levels, codes=codes, names=_KEYS, verify_integrity=False)
+
+
+def _quantiles(data, measures, by):
+    values = data[measures].astype('float64')
+    if by is None:
+        table = values.quantile(list(QUANTILES.values())).T
+        table.columns = list(QUANTILES)
+        table.index = pd.MultiIndex.from_tuples(
+            [(ALL_YEARS, ALL_REGIONS, measure) for measure in table.index], names=_KEYS
+        )
+        return table
+    keys = data[by].astype(str) if by == 'Region' else data[by]
+    table = values.groupby(keys, observed=True).quantile(list(QUANTILES.values()))
+    table = table.stack().unstack(level=1)
+    table.columns = list(QUANTILES)
+    table.index = table.index.set_names([by, 'Measure'])
+    table = table.reset_index()
+    if by == 'Region':
+        table['Year'] = ALL_YEARS
+    else:
+        table['Region'] = ALL_REGIONS
+    return table.set_index(_KEYS)
+
+
+def _leaf_quantiles(data, measures):
+    values = data[measures].astype('float64')
+    keys = [data['Year'], data['Region'].astype(str)]
+    table = values.groupby(keys, observed=True).quantile(list(QUANTILES.values()))
+    table = table.stack().unstack(level=2)
+    table.columns = list(QUANTILES)
+    table.index = table.index.set_names(_KEYS)
+    return table
+
+
+def _all_quantiles(data, measures):
+    return pd.concat([
+        _leaf_quantiles(data, measures),
+        _quantiles(data, measures, 'Year'),
+        _quantiles(data, measures, 'Region'),
+        _quantiles(data, measures, None),
+    ])
+
+
+def _finish(cells, labels):
+    keys, moments = cells
+    count = moments['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.where(count > 1, np.sqrt(moments['M2'] / (count - 1)), np.nan)
+    return pd.DataFrame(dict(moments, std=std), index=_index(keys, labels)).sort_index()
+
+
+class StatsCube:
+    def __init__(self, table, data=None, measures=MEASURES, quantiles=None):
+        self.table = table
+        # Row data the quartiles are computed from on first use
+        self.data = data
+        self.measures = measures
+        self._quantiles = quantiles
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, data, measures=MEASURES):
+        """Every cell of the cube from the row data; quartiles wait until asked for."""
+        labels = _labels(measures, data['Region'].astype('category').cat.categories.astype(str))
+        leaves = _leaf_moments(data, labels)
+        by_year = _rollup(leaves, 'Region', labels)
+        cells = _concat(leaves, by_year, _rollup(leaves, 'Year', labels), _rollup(by_year, 'Year', labels))
+        return cls(_finish(cells, labels), data, measures)
+
+    def quantiles(self):
+        """Quartiles of every cell, computed from the rows on first use."""
+        if self._quantiles is None:
+            with self._lock:
+                if self._quantiles is None:
+                    self._quantiles = _all_quantiles(self.data, self.measures).sort_index()
+        return self._quantiles
+
+    def update(self, data, changed_years, measures=MEASURES):
+        """
+        New cube for data in which only changed_years differ from the data this
+        cube was built from; the cells of other years are reused.
+        """
+        changed = set(changed_years)
+        years = self.table.index.get_level_values('Year')
+        kept = self.table[(years != ALL_YEARS) & ~years.isin(changed)]
+        kept_leaves = kept[kept.index.get_level_values('Region') != ALL_REGIONS]
+
+        changed_rows = data[data['Year'].isin(changed)]
+        labels = _labels(
+            measures, kept.index.get_level_values('Region'),
+            changed_rows['Region'].astype('category').cat.categories.astype(str)
+        )
+        leaves = _cells(kept_leaves, labels)
+        parts = []
+        if len(changed_rows):
+            new_leaves = _leaf_moments(changed_rows, labels)
+            leaves = _concat(leaves, new_leaves)
+            parts += [new_leaves, _rollup(new_leaves, 'Region', labels)]
+        by_year = _rollup(leaves, 'Region', labels)
+        parts += [_rollup(leaves, 'Year', labels), _rollup(by_year, 'Year', labels)]
+        table = pd.concat([kept, _finish(_concat(*parts), labels)]).sort_index()
+
+        quantiles = None
+        if self._quantiles is not None:
+            # Already in use: keep unchanged years, recompute changed years and the rollups
+            old = self._quantiles
+            old_years = old.index.get_level_values('Year')
+            parts = [old[(old_years != ALL_YEARS) & ~old_years.isin(changed)]]
+            if len(changed_rows):
+                parts += [_leaf_quantiles(changed_rows, measures), _quantiles(changed_rows, measures, 'Year')]
+            parts += [_quantiles(data, measures, 'Region'), _quantiles(data, measures, None)]
+            quantiles = pd.concat(parts).sort_index()
+        return StatsCube(table, data, measures, quantiles)
+
+    def _source(self, stat):
+        return self.quantiles() if stat in QUANTILES else self.table
+
+    def get(self, stat='mean', measure='Happiness Score', year=ALL_YEARS, region=ALL_REGIONS):
+        """One statistic of one cell, e.g. get('max', 'Freedom', year=2019)."""
+        return float(self._source(stat).at[(year, region, measure), stat])
+
+    def table_by(self, by, stat='mean', measure='Happiness Score', year=ALL_YEARS, region=ALL_REGIONS):
+        """
+        A statistic along one axis, e.g. table_by('Region', year=2019) for the
+        mean score of every region in 2019, or table_by(['Region', 'Year']).
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        source = self._source(stat)
+        index = source.index
+
+        def matches(level, value):
+            position = _KEYS.index(level)
+            return index.codes[position] == index.levels[position].get_indexer([value])[0]
+
+        mask = matches('Measure', measure)
+        for level, fixed, total in (('Year', year, ALL_YEARS), ('Region', region, ALL_REGIONS)):
+            mask &= ~matches(level, total) if level in by else matches(level, fixed)
+        series = source[stat][mask]
+        return series.droplevel([level for level in _KEYS if level not in by])
+
+    def to_frame(self):
+        """Flat frame for the dataset snapshot (with quartiles only if already computed)."""
+        table = self.table if self._quantiles is None else self.table.join(self._quantiles)
+        frame = table.reset_index()
+        frame['Region'] = frame['Region'].astype('category')
+        frame['Measure'] = frame['Measure'].astype('category')
+        return frame
+
+    @classmethod
+    def from_frame(cls, frame, data=None, measures=MEASURES):
+        frame = frame.assign(Region=frame['Region'].astype(str), Measure=frame['Measure'].astype(str))
+        table = frame.set_index(_KEYS).sort_index()
+        quantiles = table[list(QUANTILES)] if set(QUANTILES) <= set(table.columns) else None
+        return cls(table.drop(columns=list(QUANTILES), errors='ignore'), data, measures, quantiles)
@@ -5,7 +5,34 @@ from frontend.components.sidebar import create_sidebar
 from frontend.components.info_cards import create_info_cards
 from frontend.components.modals import create_help_modal
 from frontend.components.sidebar import create_menu_sidebar
-def create_layout(dashboard):
+from app.callbacks import FIGURE_BUILDERS, graph_filter_ids
+from app.geo import topojson_url
+def create_layout(dashboard, figure_assets=None, lazy=False):
+    # Load map geometry from the app's own assets when it is bundled
+    geometry_url = topojson_url()
+    map_config = {'config': {'topojsonURL': geometry_url}} if geometry_url else {}
+
+    # Where the browser finds the pre-rendered unfiltered figures, and the
+    # filters it forwards to the server for every other view
+    prerendered = [
+        dcc.Store(id='figure-assets', data=figure_assets.manifest(dashboard)),
+        dcc.Store(id='prerendered-view'),
+        dcc.Store(id='server-year'),
+        dcc.Store(id='server-regions'),
+        dcc.Store(id='server-countries'),
+        dcc.Store(id='server-range'),
+    ] if figure_assets is not None else []
+
+    # Lazy mode: the graphs in view, and each graph's own copy of the filters
+    lazy_graphs = [
+        dcc.Store(id='lazy-graphs', data=list(FIGURE_BUILDERS)),
+        dcc.Store(id='visible-graphs'),
+        html.Button(id='graph-visibility', n_clicks=0, style={'display': 'none'}),
+    ] + [
+        dcc.Store(id=component_id)
+        for graph_id in FIGURE_BUILDERS for component_id in graph_filter_ids(graph_id)
+    ] if lazy else []
+
     return dbc.Container([
         create_header(),
         create_menu_sidebar(),
@@ -13,11 +40,20 @@ def create_layout(dashboard):
             dbc.Col(create_sidebar(dashboard), width=3),
             dbc.Col([
                 create_info_cards(dashboard),
-                dcc.Graph(id='world-map'),
+                dcc.Graph(id='world-map', **map_config),
                 dcc.Graph(id='scatter-plot'),
                 dcc.Graph(id='bar-chart'),
+                # Structure of the figure currently rendered in the browser, so
+                # later updates can be sent as patches
+                dcc.Store(id='world-map-signature'),
+                dcc.Store(id='scatter-plot-signature'),
+                dcc.Store(id='bar-chart-signature'),
+                # Country -> region table for the clientside region selection
+                dcc.Store(id='country-regions', data=dashboard.get_country_regions()),
                 dcc.Graph(id='pie-chart'),
                 dcc.Graph(id='regional-trends'),
+                *prerendered,
+                *lazy_graphs,
             ], width=9)
         ]),
         create_help_modal()
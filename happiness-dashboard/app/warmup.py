@@ -0,0 +1,101 @@
+"""
+Fill the figure cache with the views most sessions open first.
+
+Those are every year with a single region picked and the full happiness
+range, then every year unfiltered. When unfiltered views are served as
+pre-rendered files (app/figure_assets.py) they never reach the callbacks,
+so only the single-region views are warmed. They are built on a small
+thread pool, the newest year first, until they are all cached or the short
+time budget runs out; whatever is left is built on demand as usual.
+
+Under gunicorn the app is preloaded, so the warm-up runs once in the master
+and every forked worker starts with the warm cache. All pool threads are
+joined before returning, so none are left running at fork time.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.callbacks import FIGURE_BUILDERS, apply_filters, cached_figure
+from app.metrics import current_callback
+
+logger = logging.getLogger(__name__)
+
+
+def default_filters(view, unfiltered=True):
+    """(year, regions) of the default views, single-region views first."""
+    years = sorted((option['value'] for option in view.summary['year_options']), reverse=True)
+    regions = [option['value'] for option in view.summary['region_options']]
+    filters = [(year, [region]) for year in years for region in regions]
+    if unfiltered:
+        filters += [(year, []) for year in years]
+    return filters
+
+
+class FigureWarmup:
+    def __init__(self, dashboard, figure_cache, budget=None, threads=None, figure_pool=None, animate_years=False,
+                 prerendered=False):
+        self.dashboard = dashboard
+        self.figure_cache = figure_cache
+        self.figure_pool = figure_pool
+        self.animate_years = animate_years
+        # Pre-rendered files serve the unfiltered views (and FigureAssets builds them)
+        self.prerendered = prerendered
+        # Short by default: startup waits for the warm-up
+        self.budget = float(os.environ.get('FIGURE_WARMUP_SECONDS', 2) if budget is None else budget)
+        self.threads = int(os.environ.get('FIGURE_WARMUP_THREADS', min(4, os.cpu_count() or 1))
+                           if threads is None else threads)
+        self.last_run = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        """Build the default views until done or out of budget; returns the coverage report."""
+        if self.budget <= 0:
+            return None
+        with self._lock:
+            view = self.dashboard.snapshot()
+            happiness_range = list(view.summary['score_bounds'])
+            deadline = time.monotonic() + self.budget
+            start = time.perf_counter()
+            built = []
+
+            def warm(year, regions, graph_id, state_cache):
+                if time.monotonic() > deadline:
+                    return
+                # Keep warm-up builds apart from real callbacks in the stage metrics
+                current_callback.set('figure-warmup')
+                try:
+                    # Filtering is shared by the five figures of one view
+                    state = state_cache.get('state')
+                    if state is None:
+                        state = state_cache['state'] = apply_filters(
+                            view, year, regions, None, happiness_range, self.animate_years
+                        )
+                    cached_figure(self.figure_cache, view, graph_id, state, record=False, figure_pool=self.figure_pool)
+                    built.append(graph_id)
+                except Exception:
+                    logger.exception("Warming %s for %s %s failed", graph_id, year, regions)
+
+            filters = default_filters(view, unfiltered=not self.prerendered)
+            with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='figure-warmup') as executor:
+                for year, regions in filters:
+                    state_cache = {}
+                    for graph_id in FIGURE_BUILDERS:
+                        executor.submit(warm, year, regions, graph_id, state_cache)
+
+            total = len(filters) * len(FIGURE_BUILDERS)
+            self.last_run = {
+                'figures': len(built),
+                'total': total,
+                'coverage': round(len(built) / total, 3) if total else 1.0,
+                'seconds': round(time.perf_counter() - start, 3),
+                'data_version': view.data_version,
+            }
+            logger.info(
+                "Warmed %d of %d default figures (%.0f%%) in %.2f s with %d thread%s",
+                len(built), total, 100 * self.last_run['coverage'], self.last_run['seconds'], self.threads,
+                '' if self.threads == 1 else 's'
+            )
+            return self.last_run
@@ -0,0 +1,67 @@
+"""
+Payload and build time of the animated figures (FIGURE_ANIMATION=1) against
+one single-year figure and one figure per year.
+
+    python -m benchmarks.bench_animation [--output results.json]
+
+An animated figure is sent once per region/country/range filter and then
+covers every year change in the browser; the per-year figures are what the
+same year changes cost without it (as full figures, before patching).
+"""
+import argparse
+import time
+
+import plotly.io as pio
+
+from benchmarks.common import DATA_PATH, write_json
+
+FILTERS = {
+    'all regions': dict(regions=None),
+    'one region': dict(regions=['Western Europe']),
+    'three regions': dict(regions=['Western Europe', 'Eastern Asia', 'Sub-Saharan Africa']),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    from app.callbacks import ANIMATED_FIGURES, FIGURE_BUILDERS
+    from app.data_processor import HappinessDashboard
+
+    dashboard = HappinessDashboard(DATA_PATH)
+    years = [int(year) for year in dashboard.engine.years]
+    happiness_range = list(dashboard.summary['score_bounds'])
+    # Warm up plotly's validators before timing
+    dashboard.create_year_frames('create_bar_chart', None, ['Western Europe'], None, happiness_range)
+
+    report = {}
+    print(f"{'figure':<16}{'filter':<16}{'frames ms':>10}{'frames KiB':>11}{'1 year KiB':>11}{'all years KiB':>14}")
+    for graph_id in ANIMATED_FIGURES:
+        builder_name = FIGURE_BUILDERS[graph_id]
+        for label, filters in FILTERS.items():
+            start = time.perf_counter()
+            animated = dashboard.create_year_frames(builder_name, None, filters['regions'], None, happiness_range)
+            build_ms = (time.perf_counter() - start) * 1000
+            animated_bytes = len(pio.to_json(animated, validate=False))
+            year_bytes = [
+                len(pio.to_json(getattr(dashboard, builder_name)(year, filters['regions'], None, happiness_range),
+                                validate=False))
+                for year in years
+            ]
+            report[f'{graph_id} / {label}'] = {
+                'build_ms': build_ms,
+                'animated_bytes': animated_bytes,
+                'single_year_bytes': year_bytes[-1],
+                'all_years_bytes': sum(year_bytes),
+            }
+            print(f"{graph_id:<16}{label:<16}{build_ms:>10.1f}{animated_bytes / 1024:>11.1f}"
+                  f"{year_bytes[-1] / 1024:>11.1f}{sum(year_bytes) / 1024:>14.1f}")
+
+    if args.output:
+        write_json(args.output, report)
+
+
+if __name__ == '__main__':
+    main()
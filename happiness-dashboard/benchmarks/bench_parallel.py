@@ -0,0 +1,99 @@
+"""
+Latency of a full dashboard update (all five figures) with figures built in
+the worker's threads versus in a pool of helper processes.
+
+    python -m benchmarks.bench_parallel [--updates 20] [--processes 5] [--output results.json]
+
+Each update picks a year and region and requests the five figures at once
+from five threads, as a gthread worker serving the browser's five callback
+requests would. The figure cache is bypassed so every update pays for the
+builds. "serial" builds in those threads (FIGURE_BUILD_MODE=serial); "process"
+hands the builds to app.figure_pool (FIGURE_BUILD_MODE=process). The speedup
+depends on the number of cores; on a single core there is none to gain.
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.common import DATA_PATH, write_json
+
+
+def run_updates(view, states, build):
+    from app.callbacks import FIGURE_BUILDERS, figure_request
+
+    latencies = []
+    with ThreadPoolExecutor(max_workers=len(FIGURE_BUILDERS)) as executor:
+        for state in states:
+            start = time.perf_counter()
+            futures = []
+            for graph_id in FIGURE_BUILDERS:
+                _, builder_name, args = figure_request(graph_id, state)
+                futures.append(executor.submit(build, builder_name, args))
+            for future in futures:
+                future.result()
+            latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--updates', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    from app.callbacks import apply_filters
+    from app.data_processor import HappinessDashboard
+    from app.figure_pool import FigurePool
+    from app.serialization import compact_figure, to_json
+
+    view = HappinessDashboard(DATA_PATH).snapshot()
+    rng = random.Random(args.seed)
+    years = [option['value'] for option in view.summary['year_options']]
+    regions = [option['value'] for option in view.summary['region_options']]
+    happiness_range = list(view.summary['score_bounds'])
+    states = [
+        apply_filters(view, rng.choice(years), rng.sample(regions, rng.randint(0, 2)), None, happiness_range)
+        for _ in range(args.updates)
+    ]
+
+    def build_serial(builder_name, args):
+        # What the callbacks and Dash do with the figure, so both modes end in JSON
+        return to_json(compact_figure(getattr(view, builder_name)(*args)))
+
+    pool = FigurePool(DATA_PATH, processes=args.processes)
+
+    def build_process(builder_name, args):
+        return to_json(pool.build(view, builder_name, args))
+
+    # First builds pay for plotly's validators and the helpers' start-up
+    run_updates(view, states[:2], build_serial)
+    for _ in range(args.processes):
+        run_updates(view, states[:1], build_process)
+
+    report = {'cpus': os.cpu_count(), 'processes': args.processes, 'updates': args.updates}
+    print(f"{os.cpu_count()} CPUs, {args.processes} helper processes, {args.updates} updates")
+    print(f"{'mode':<10}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}")
+    for mode, build in (('serial', build_serial), ('process', build_process)):
+        latencies = run_updates(view, states, build)
+        report[mode] = {
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'mean_ms': float(latencies.mean()),
+        }
+        print(f"{mode:<10}{report[mode]['p50_ms']:>9.1f}{report[mode]['p95_ms']:>9.1f}{report[mode]['mean_ms']:>9.1f}")
+    pool.shutdown()
+
+    report['speedup_p50'] = report['serial']['p50_ms'] / report['process']['p50_ms']
+    print(f"p50 speedup: {report['speedup_p50']:.2f}x")
+    if args.output:
+        write_json(args.output, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare full-figure and Dash Patch responses for the year-dependent figures.
+
+    python -m benchmarks.bench_patch [--rounds 3] [--output results.json]
+
+Replays a year scrubbing session against the Flask test client, once with
+FIGURE_PATCH_UPDATES=0 and once with it on, and reports response bytes and
+server time per figure. The figure cache is disabled so every request pays
+the build cost. Requests go to the per-graph filter stores the figure
+callbacks take (LAZY_FIGURES=1).
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import callback_payload, filter_inputs, write_json
+
+GRAPH_IDS = ['world-map', 'scatter-plot', 'bar-chart']
+
+
+def run_session(patch_updates, years, rounds):
+    os.environ['FIGURE_PATCH_UPDATES'] = '1' if patch_updates else '0'
+    os.environ['FIGURE_CACHE_ENTRIES'] = '0'
+    os.environ['FIGURE_WARMUP_SECONDS'] = '0'
+    os.environ['FIGURE_ASSETS'] = '0'
+    os.environ['LAZY_FIGURES'] = '1'
+    from app.callbacks import graph_filter_ids
+    from app.main import create_dash_app
+
+    app = create_dash_app()
+    client = app.server.test_client()
+    results = {}
+
+    for graph_id in GRAPH_IDS:
+        filter_ids = graph_filter_ids(graph_id)
+        signature = None
+        sizes, timings = [], []
+        for _ in range(rounds):
+            for year in years:
+                outputs = [(graph_id, 'figure')]
+                state = []
+                if patch_updates:
+                    outputs.append((f'{graph_id}-signature', 'data'))
+                    state = [{'id': f'{graph_id}-signature', 'property': 'data', 'value': signature}]
+                inputs = filter_inputs(year, ids=filter_ids, prop='data')
+                body = callback_payload(outputs, inputs, state, [f'{filter_ids[0]}.data'])
+
+                start = time.perf_counter()
+                response = client.post('/_dash-update-component', json=body)
+                timings.append(time.perf_counter() - start)
+                sizes.append(len(response.data))
+
+                if patch_updates:
+                    signature_update = response.get_json()['response'].get(f'{graph_id}-signature')
+                    if signature_update:
+                        signature = signature_update['data']
+
+        results[graph_id] = {
+            'requests': len(sizes),
+            'first_bytes': sizes[0],
+            'mean_bytes': sum(sizes) / len(sizes),
+            'total_bytes': sum(sizes),
+            'mean_ms': 1000 * sum(timings) / len(timings),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    years = [2019, 2018, 2017, 2016, 2015]
+    report = {
+        'full': run_session(False, years, args.rounds),
+        'patch': run_session(True, years, args.rounds),
+    }
+
+    print(f"{'figure':<14}{'mode':<7}{'first B':>10}{'mean B':>10}{'total B':>11}{'mean ms':>9}")
+    for graph_id in GRAPH_IDS:
+        for mode in ('full', 'patch'):
+            row = report[mode][graph_id]
+            print(f"{graph_id:<14}{mode:<7}{row['first_bytes']:>10}{row['mean_bytes']:>10.0f}"
+                  f"{row['total_bytes']:>11}{row['mean_ms']:>9.1f}")
+
+    if args.output:
+        write_json(args.output, report)
+
+
+if __name__ == '__main__':
+    main()
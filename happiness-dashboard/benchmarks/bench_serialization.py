@@ -0,0 +1,103 @@
+"""
+Bytes on the wire and encode time of every figure, before and after the
+serialization changes in app/serialization.py.
+
+    python -m benchmarks.bench_serialization [--repeat 20] [--output results.json]
+
+"before" is the figure as the builders made it (full precision, complete
+template) encoded by Plotly's encoder, which is what Dash used to send.
+"after" is the rounded, compacted dict the figure cache keeps, encoded with
+orjson. Encode time is per response: cached figures are encoded again for
+every request. Wire sizes are shown raw, gzipped and, when the brotli
+package is installed, brotli-compressed as app/compression.py sends them.
+"""
+import argparse
+import gzip
+import time
+
+from plotly.io.json import to_json_plotly
+
+from benchmarks.common import DATA_PATH, write_json
+
+VIEWS = {
+    'unfiltered': dict(regions=None, countries=None),
+    'one region': dict(regions=['Western Europe'], countries=None),
+    'three countries': dict(regions=None, countries=['Norway', 'Japan', 'Brazil']),
+}
+
+
+def best_ms(function, repeat):
+    function()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def wire_sizes(text):
+    from app.compression import BROTLI_QUALITY, GZIP_LEVEL, brotli
+
+    body = text.encode('utf-8')
+    sizes = {'raw': len(body), 'gzip': len(gzip.compress(body, GZIP_LEVEL))}
+    if brotli is not None:
+        sizes['br'] = len(brotli.compress(body, quality=BROTLI_QUALITY))
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    from app import serialization
+    from app.callbacks import FIGURE_BUILDERS, apply_filters, figure_request
+    from app.data_processor import HappinessDashboard
+
+    view = HappinessDashboard(DATA_PATH).snapshot()
+    year = max(option['value'] for option in view.summary['year_options'])
+    happiness_range = list(view.summary['score_bounds'])
+    precision = serialization.PRECISION
+
+    report = {}
+    print(f"{'figure':<16}{'view':<17}{'raw KiB':>15}{'gzip KiB':>15}{'encode ms':>15}")
+    for label, filters in VIEWS.items():
+        state = apply_filters(view, year, filters['regions'], filters['countries'], happiness_range)
+        for graph_id in FIGURE_BUILDERS:
+            _, builder_name, builder_args = figure_request(graph_id, state)
+            serialization.PRECISION = {}
+            before = getattr(view, builder_name)(*builder_args)
+            serialization.PRECISION = precision
+            after = serialization.compact_figure(getattr(view, builder_name)(*builder_args))
+
+            row = {}
+            for name, encode in (('before', lambda: to_json_plotly(before)),
+                                 ('after', lambda: serialization.to_json(after))):
+                row[name] = dict(wire_sizes(encode()), encode_ms=best_ms(encode, args.repeat))
+            report[f'{graph_id} / {label}'] = row
+            print(f"{graph_id:<16}{label:<17}"
+                  f"{row['before']['raw'] / 1024:>7.1f} -> {row['after']['raw'] / 1024:<5.1f}"
+                  f"{row['before']['gzip'] / 1024:>7.1f} -> {row['after']['gzip'] / 1024:<5.1f}"
+                  f"{row['before']['encode_ms']:>7.2f} -> {row['after']['encode_ms']:<5.2f}")
+
+    totals = {
+        side: {key: sum(row[side][key] for row in report.values()) for key in report[next(iter(report))][side]}
+        for side in ('before', 'after')
+    }
+    # Responses were not compressed before
+    wire = 'br' if 'br' in totals['after'] else 'gzip'
+    totals['wire_ratio'] = totals['after'][wire] / totals['before']['raw']
+    report['total'] = totals
+    print(' '.join(
+        f"{key}: {totals['before'][key]:.0f} -> {totals['after'][key]:.0f}"
+        f" ({totals['after'][key] / totals['before'][key]:.0%})" for key in totals['before']
+    ))
+    print(f"on the wire: {totals['wire_ratio']:.0%} of the uncompressed bytes sent before ({wire})")
+    if args.output:
+        write_json(args.output, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Benchmark the dashboard's data preparation, figure builders and callbacks on
+the real dataset and on synthetic copies scaled up in countries and years.
+
+    python -m benchmarks.bench_suite [--scales 1 10 100 1000] [--repeat 3]
+        [--output benchmarks/results/latest.json] [--baseline benchmarks/baseline.json]
+        [--save-baseline] [--tolerance 0.25]
+
+Every case records its best wall time over --repeat runs, its peak traced
+memory (tracemalloc, from a separate run so tracing does not skew the timing)
+and the size of its serialized output. Results are compared by name against
+the baseline; any case slower or hungrier than the baseline by more than the
+tolerance is listed and makes the command exit non-zero.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import (
+    DATA_PATH, PROJECT_ROOT, callback_context, callback_function, synthetic_dataset, write_json
+)
+from app.serialization import to_json
+
+# Scale factor -> (country copies, year copies)
+SCALES = {1: (1, 1), 10: (5, 2), 100: (20, 5), 1000: (50, 20)}
+DEFAULT_OUTPUT = os.path.join(PROJECT_ROOT, 'benchmarks', 'results', 'latest.json')
+DEFAULT_BASELINE = os.path.join(PROJECT_ROOT, 'benchmarks', 'baseline.json')
+# Timing differences below this are noise, whatever the ratio
+MIN_WALL_DELTA_MS = 5
+FIGURE_CALLBACKS = ['world-map.figure', 'scatter-plot.figure', 'bar-chart.figure',
+                    'regional-trends.figure', 'pie-chart.figure']
+
+
+def output_size(result):
+    # Encoded as the app encodes callback responses (numpy arrays, figures, patches)
+    return len(to_json(result).encode('utf-8'))
+
+
+def measure(run, repeat):
+    # Warm up first so one-off imports and validator loading are not counted
+    run()
+    tracemalloc.start()
+    result = run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return {
+        'wall_ms': round(1000 * min(timings), 3),
+        'peak_kib': round(peak / 1024, 1),
+        'json_bytes': output_size(result),
+    }
+
+
+def use_dataset(app, path):
+    """Swap the dataset at path into the app's dashboard, as a reload would, and return it."""
+    from app.data_processor import HappinessDashboard
+
+    dashboard = app.dashboard
+    if dashboard.data_path != path:
+        fresh = HappinessDashboard(path)
+        with dashboard._swap_lock:
+            dashboard.__dict__.update(
+                fresh.__dict__, _swap_lock=dashboard._swap_lock, data_version=dashboard.data_version + 1
+            )
+    return dashboard
+
+
+def cases(app, path):
+    from app.data_processor import HappinessDashboard
+    from app.dataset import read_dataset
+
+    dashboard = use_dataset(app, path)
+    year = dashboard.engine.years[-1]
+
+    def prepare_data():
+        fresh = HappinessDashboard.__new__(HappinessDashboard)
+        fresh.data = read_dataset(path)
+        fresh.prepare_data()
+        return fresh.get_year_options()
+
+    yield 'prepare_data', prepare_data
+    yield 'create_world_map', lambda: dashboard.create_world_map(year)
+    yield 'create_scatter_plot', lambda: dashboard.create_scatter_plot(year)
+    yield 'create_bar_chart', lambda: dashboard.create_bar_chart(year)
+    yield 'create_country_trends', lambda: dashboard.create_country_trends()
+    yield 'create_pie_chart', lambda: dashboard.create_pie_chart(year)
+    yield 'get_country_options', lambda: dashboard.get_country_options()
+
+    # Every figure callback a year change fires (the old update_dashboard),
+    # uncached and with full figures, called directly with a stubbed context
+    functions = [callback_function(app, output) for output in FIGURE_CALLBACKS]
+
+    def update_dashboard():
+        with callback_context(['year-selector.value']):
+            return [function(year, None, None, [0, 10]) for function in functions]
+
+    yield 'update_dashboard', update_dashboard
+
+
+def run_suite(scales, repeat):
+    # Measure the builders themselves, not snapshots or the figure cache
+    os.environ['DATASET_SNAPSHOTS'] = '0'
+    os.environ['FIGURE_CACHE_ENTRIES'] = '0'
+    os.environ['FIGURE_PATCH_UPDATES'] = '0'
+    # No warm-up or figure files at startup, and figure callbacks that take the
+    # filter selectors directly, as the stubbed callback context expects
+    os.environ['FIGURE_WARMUP_SECONDS'] = '0'
+    os.environ['FIGURE_ASSETS'] = '0'
+    os.environ['LAZY_FIGURES'] = '0'
+
+    from app.main import create_dash_app
+
+    # One app for every scale; each scale's dataset is swapped into it
+    app = create_dash_app()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for scale in scales:
+            country_copies, year_copies = SCALES[scale]
+            path = DATA_PATH if scale == 1 else synthetic_dataset(
+                os.path.join(directory, f'happiness_{scale}x.csv'), country_copies, year_copies
+            )
+            for name, run in cases(app, path):
+                key = f'{name}@{scale}x'
+                results[key] = measure(run, repeat)
+                row = results[key]
+                print(f"{key:<32}{row['wall_ms']:>12.1f}{row['peak_kib']:>12.0f}{row['json_bytes']:>12}")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Names of the cases that regressed by more than the tolerance, with details."""
+    regressions = []
+    for name, row in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        for metric in ('wall_ms', 'peak_kib', 'json_bytes'):
+            if metric == 'wall_ms' and row[metric] - reference[metric] < MIN_WALL_DELTA_MS:
+                continue
+            if reference[metric] and row[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{name} {metric}: {row[metric]} vs {reference[metric]} "
+                    f"(+{row[metric] / reference[metric] - 1:.0%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=sorted(SCALES), choices=sorted(SCALES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    # Keep the table readable; the app's startup warnings do not matter here
+    logging.getLogger('app').setLevel(logging.ERROR)
+    print(f"{'case':<32}{'wall ms':>12}{'peak KiB':>12}{'JSON B':>12}")
+    results = run_suite(args.scales, args.repeat)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'repeat': args.repeat,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    write_json(args.output, report)
+
+    if args.save_baseline:
+        write_json(args.baseline, report)
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%}:")
+        for line in regressions:
+            print('  ' + line)
+        sys.exit(1)
+    print(f"\nNo regressions over {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Build time and payload size of the country trends figure against the number
+of series shown.
+
+    python -m benchmarks.bench_trends [--series 10 100 1000 10000] [--repeat 3] [--output results.json]
+
+The dataset is cloned until it has enough countries for the largest series
+count, then each run selects that many countries.
+"""
+import argparse
+import math
+import os
+import tempfile
+import time
+
+import pandas as pd
+import plotly.io as pio
+
+from benchmarks.common import DATA_PATH, synthetic_dataset, write_json
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--series', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    os.environ['DATASET_SNAPSHOTS'] = '0'
+    from app.data_processor import HappinessDashboard
+
+    base_countries = pd.read_csv(DATA_PATH, usecols=['Country'])['Country'].nunique()
+    with tempfile.TemporaryDirectory() as directory:
+        path = synthetic_dataset(os.path.join(directory, 'trends.csv'),
+                                 country_copies=math.ceil(max(args.series) / base_countries))
+        dashboard = HappinessDashboard(path)
+    countries = dashboard.engine.sorted_countries
+    # Warm up plotly's validators before timing
+    dashboard.create_country_trends(countries=countries[:1])
+
+    report = {}
+    print(f"{'series':>8}{'traces':>8}{'build ms':>10}{'JSON KiB':>10}")
+    for series in args.series:
+        selected = countries[:series]
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fig = dashboard.create_country_trends(countries=selected)
+            timings.append(time.perf_counter() - start)
+        size = len(pio.to_json(fig))
+        report[series] = {'traces': len(fig.data), 'build_ms': 1000 * min(timings), 'json_bytes': size}
+        print(f"{series:>8}{len(fig.data):>8}{1000 * min(timings):>10.1f}{size / 1024:>10.1f}")
+
+    if args.output:
+        write_json(args.output, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import contextlib
+import inspect
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Benchmarks run from anywhere but load data relative to the project root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+os.chdir(PROJECT_ROOT)
+
+from dash._callback_context import context_value  # noqa: E402
+from dash._utils import AttributeDict  # noqa: E402
+
+from app.dataset import FACTOR_COLUMNS  # noqa: E402
+
+DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'happiness_info.csv')
+
+FILTER_IDS = ['year-selector', 'region-selector', 'country-selector', 'happiness-range']
+
+
+def filter_inputs(year, regions=None, countries=None, happiness_range=(0, 10), ids=FILTER_IDS, prop='value'):
+    values = [year, regions, countries, list(happiness_range)]
+    return [{'id': component_id, 'property': prop, 'value': value}
+            for component_id, value in zip(ids, values)]
+
+
+def callback_payload(outputs, inputs, state=None, changed=None):
+    """Body of a /_dash-update-component request, as the Dash renderer sends it."""
+    outputs = [{'id': component_id, 'property': prop} for component_id, prop in outputs]
+    if len(outputs) == 1:
+        output_key, output_spec = f"{outputs[0]['id']}.{outputs[0]['property']}", outputs[0]
+    else:
+        output_key = '..' + '...'.join(f"{o['id']}.{o['property']}" for o in outputs) + '..'
+        output_spec = outputs
+    if changed is None:
+        changed = [f"{i['id']}.{i['property']}" for i in inputs]
+    return {
+        'output': output_key,
+        'outputs': output_spec,
+        'inputs': inputs,
+        'state': state or [],
+        'changedPropIds': changed,
+    }
+
+
+@contextlib.contextmanager
+def callback_context(changed=()):
+    """Run callback bodies outside a request, as if the given props had triggered them."""
+    triggered = [{'prop_id': prop_id, 'value': None} for prop_id in changed]
+    token = context_value.set(AttributeDict(triggered_inputs=triggered))
+    try:
+        yield
+    finally:
+        context_value.reset(token)
+
+
+def callback_function(app, output):
+    """The undecorated function of the callback registered for an output key."""
+    return inspect.unwrap(app.callback_map[output]['callback'])
+
+
+def write_json(path, payload):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2)
+
+
+def synthetic_dataset(path, country_copies=1, year_copies=1, seed=0, source=DATA_PATH):
+    """
+    Write a scaled-up copy of the dataset to path: every country is cloned
+    country_copies times (as "<name> #<n>") and the year span is repeated
+    year_copies times after the last year. Scores and factors get a little
+    noise so the copies are not identical. The copies are registered as
+    aliases of the original country in app.geo.
+    """
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(source)
+    span = base['Year'].max() - base['Year'].min() + 1
+    frames = []
+    for year_copy in range(year_copies):
+        for country_copy in range(country_copies):
+            frame = base.copy()
+            frame['Year'] += year_copy * span
+            if country_copy:
+                frame['Country'] = frame['Country'] + f' #{country_copy}'
+            frames.append(frame)
+    data = pd.concat(frames, ignore_index=True)
+    numeric = ['Happiness Score'] + FACTOR_COLUMNS
+    noise = rng.normal(0, 0.05, size=(len(data), len(numeric)))
+    data[numeric] = (data[numeric] + noise).clip(lower=0).round(5)
+    data['Happiness Score'] = data['Happiness Score'].clip(upper=10)
+    data.to_csv(path, index=False)
+
+    # Let the copies resolve to their original's ISO-3 code so the map draws them too
+    from app.geo import COUNTRY_ALIASES, NO_ISO3
+    for country_copy in range(1, country_copies):
+        for country in base['Country'].unique():
+            copy = f'{country} #{country_copy}'
+            COUNTRY_ALIASES[copy] = COUNTRY_ALIASES.get(country, country)
+            if country in NO_ISO3:
+                NO_ISO3.add(copy)
+    return path
@@ -0,0 +1,355 @@
+"""
+Replay scripted dashboard sessions against the server with concurrent
+virtual users and report latency percentiles per callback.
+
+    python -m benchmarks.load_test [--url http://127.0.0.1:8050] [--users 8]
+        [--sessions 3] [--think-ms 0] [--seed 0] [--visible world-map,scatter-plot]
+        [--output results.json]
+
+Without --url the app is created in-process and driven through the Flask
+test client; with --url the requests go over HTTP to a running server
+(e.g. gunicorn); use that to size workers, since in-process users share one
+interpreter. Each session loads the page, scrubs through a few years,
+picks regions, clicks countries on the map and drags the happiness range.
+Every step posts the /_dash-update-component requests the browser would
+send for it, built from /_dash-dependencies and the served layout, so the
+harness follows the callbacks in app/callbacks.py as they change.
+Clientside callbacks are not requested; their effect on the filters (the
+region added for a clicked country) is applied to the session state. With
+pre-rendered figure files (FIGURE_ASSETS=1) unfiltered views fetch those
+files instead, as routeFigureRequest does, once per session as the browser
+cache would. With lazy figures (LAZY_FIGURES=1) only the graphs in view
+(--visible) are passed the filters, as forwardGraphFilters does; a quarter
+of the sessions scroll down at the end and bring the others up to date.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.common import write_json
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.server.test_client()
+
+    def get_json(self, path):
+        return self.client.get(path).get_json()
+
+    def post_json(self, path, body):
+        response = self.client.post(path, json=body)
+        return response.status_code, response.data
+
+    def get(self, path):
+        response = self.client.get(path, headers={'Accept-Encoding': 'gzip'})
+        return response.status_code, response.data
+
+
+class HttpClient:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def get_json(self, path):
+        with urllib.request.urlopen(self.url + path, timeout=60) as response:
+            return json.load(response)
+
+    def post_json(self, path, body):
+        request = urllib.request.Request(
+            self.url + path, data=json.dumps(body).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+    def get(self, path):
+        request = urllib.request.Request(self.url + path, headers={'Accept-Encoding': 'gzip'})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+
+def layout_props(node, props=None):
+    """Props of every component with a string id in a serialized layout."""
+    props = {} if props is None else props
+    if isinstance(node, dict):
+        if isinstance(node.get('props'), dict) and isinstance(node['props'].get('id'), str):
+            props[node['props']['id']] = node['props']
+        for value in node.values():
+            layout_props(value, props)
+    elif isinstance(node, list):
+        for value in node:
+            layout_props(value, props)
+    return props
+
+
+def parse_outputs(output):
+    parts = output[2:-2].split('...') if output.startswith('..') else [output]
+    outputs = [dict(zip(('id', 'property'), part.rsplit('.', 1))) for part in parts]
+    return outputs if output.startswith('..') else outputs[0]
+
+
+class Session:
+    """One virtual user: the current component values and the requests they imply."""
+
+    def __init__(self, client, dependencies, layout, rng, think_time, record, visible):
+        self.client = client
+        self.dependencies = [dependency for dependency in dependencies if not dependency.get('clientside_function')]
+        self.values = {
+            (component_id, prop): value
+            for component_id, props in layout.items() for prop, value in props.items()
+        }
+        self.layout = layout
+        self.rng = rng
+        self.think_time = think_time
+        self.record = record
+        self.loaded = set()
+        self.visible = list(visible)
+        self.forwarded = {}
+
+    def value(self, spec):
+        return self.values.get((spec['id'], spec['property']))
+
+    def fire(self, changed):
+        """Post every server callback with one of the changed props as input."""
+        for dependency in self.dependencies:
+            inputs = [f"{spec['id']}.{spec['property']}" for spec in dependency['inputs']]
+            if changed is not None and not set(inputs) & set(changed):
+                continue
+            if changed is None and dependency.get('prevent_initial_call'):
+                continue
+            body = {
+                'output': dependency['output'],
+                'outputs': parse_outputs(dependency['output']),
+                'inputs': [dict(spec, value=self.value(spec)) for spec in dependency['inputs']],
+                'state': [dict(spec, value=self.value(spec)) for spec in dependency['state']],
+                'changedPropIds': [] if changed is None else [prop for prop in inputs if prop in changed],
+            }
+            start = time.perf_counter()
+            try:
+                status, data = self.client.post_json('/_dash-update-component', body)
+            except Exception:
+                status, data = None, b''
+            self.record(dependency['output'], time.perf_counter() - start, status, len(data))
+
+            # Keep what the server sent back (signatures and the like) as session state
+            if status == 200:
+                for component_id, props in json.loads(data).get('response', {}).items():
+                    for prop, value in props.items():
+                        if prop != 'figure':
+                            self.values[(component_id, prop)] = value
+
+        if self.think_time:
+            time.sleep(self.think_time)
+
+    def set(self, **values):
+        changed = []
+        for key, value in values.items():
+            component_id = key.replace('_', '-')
+            self.values[(component_id, 'value')] = value
+            changed.append(f'{component_id}.value')
+        if 'figure-assets' in self.layout:
+            changed += self.route()
+        if 'lazy-graphs' in self.layout:
+            changed += self.forward()
+        self.fire(changed)
+
+    def route(self):
+        """Mirrors routeFigureRequest: loads the files or returns the server-* stores it sets."""
+        from app.callbacks import FILTER_SELECTORS, SERVER_FILTERS
+
+        assets = self.layout['figure-assets'].get('data')
+        year, regions, countries, happiness_range = [self.values.get((i, 'value')) for i in FILTER_SELECTORS]
+        unfiltered = assets and not regions and not countries and (
+            not happiness_range
+            or (happiness_range[0] <= assets['range'][0] and happiness_range[1] >= assets['range'][1])
+        )
+        if unfiltered and year in assets['years']:
+            self.values[('prerendered-view', 'data')] = {'year': year}
+            self.forwarded = {}
+            self.load_files(assets, year)
+            return []
+        changed = []
+        for selector, store in zip(FILTER_SELECTORS, SERVER_FILTERS):
+            value = self.values.get((selector, 'value'))
+            if self.values.get(('prerendered-view', 'data')) or value != self.values.get((store, 'data')):
+                self.values[(store, 'data')] = value
+                changed.append(f'{store}.data')
+        self.values[('prerendered-view', 'data')] = None
+        return changed
+
+    def forward(self):
+        """Mirrors forwardGraphFilters: the per-graph stores set for the graphs in view."""
+        from app.callbacks import FILTER_SELECTORS, SERVER_FILTERS, graph_filter_ids
+
+        if self.values.get(('prerendered-view', 'data')):
+            return []
+        if 'figure-assets' in self.layout:
+            sources = [(store, 'data') for store in SERVER_FILTERS]
+        else:
+            sources = [(selector, 'value') for selector in FILTER_SELECTORS]
+        filters = [self.values.get(source) for source in sources]
+        changed = []
+        for graph_id in self.visible:
+            last = self.forwarded.get(graph_id)
+            self.forwarded[graph_id] = filters
+            for index, (store, value) in enumerate(zip(graph_filter_ids(graph_id), filters)):
+                if last is None or value != last[index]:
+                    self.values[(store, 'data')] = value
+                    changed.append(f'{store}.data')
+        return changed
+
+    def load_files(self, assets, year):
+        # Mirrors loadPrerenderedFigures; files already loaded come from the browser cache
+        for graph_id in assets['graphs']:
+            name = f"{graph_id}-{'frames' if graph_id in assets['frames'] else year}.json"
+            if name not in self.loaded:
+                start = time.perf_counter()
+                try:
+                    status, data = self.client.get(assets['url'] + name)
+                except Exception:
+                    status, data = None, b''
+                self.record(f'GET {graph_id}', time.perf_counter() - start, status, len(data))
+                self.loaded.add(name)
+        for graph_id, signatures in assets['signatures'].items():
+            self.values[(f'{graph_id}-signature', 'data')] = signatures[str(year)]
+
+    def click_country(self, country):
+        # Mirrors selectClickedCountry and regionsForCountries in app/assets/clientside.js
+        countries = list(self.values.get(('country-selector', 'value')) or [])
+        countries = [c for c in countries if c != country] if country in countries else countries + [country]
+        regions = list(self.values.get(('region-selector', 'value')) or [])
+        region = self.layout.get('country-regions', {}).get('data', {}).get(country)
+        changed = {'country_selector': countries}
+        if region and region not in regions:
+            changed['region_selector'] = regions + [region]
+        self.set(**changed)
+
+    def run(self):
+        rng = self.rng
+        years = [option['value'] for option in self.layout['year-selector']['options']]
+        regions = [option['value'] for option in self.layout['region-selector']['options']]
+        countries = [option['value'] for option in self.layout['country-selector']['options']]
+        slider = self.layout['happiness-range']
+
+        self.fire(None)
+        changed = self.route() if 'figure-assets' in self.layout else []
+        if 'lazy-graphs' in self.layout:
+            changed += self.forward()
+        self.fire(changed)
+        for year in rng.sample(years, min(3, len(years))):
+            self.set(year_selector=year)
+        self.set(region_selector=rng.sample(regions, rng.randint(1, 2)))
+        for country in rng.sample(countries, 2):
+            self.click_country(country)
+        low, high = slider['min'], slider['max']
+        for step in range(1, 5):
+            self.set(happiness_range=[round(low + 0.5 * step, 1), high])
+        self.set(region_selector=[], country_selector=[])
+        if 'lazy-graphs' in self.layout and rng.random() < 0.25:
+            # Scroll through the rest of the page
+            self.visible = self.layout['lazy-graphs']['data']
+            self.fire(self.forward())
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def __call__(self, output, seconds, status, size):
+        with self.lock:
+            self.samples.setdefault(output, []).append((seconds, status, size))
+
+    def report(self, elapsed):
+        report = {}
+        for output, samples in sorted(self.samples.items()):
+            latencies = np.array([seconds for seconds, _, _ in samples]) * 1000
+            errors = sum(1 for _, status, _ in samples if status not in (200, 204))
+            report[output] = {
+                'requests': len(samples),
+                'errors': errors,
+                'error_rate': errors / len(samples),
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p95_ms': float(np.percentile(latencies, 95)),
+                'p99_ms': float(np.percentile(latencies, 99)),
+                'mean_bytes': float(np.mean([size for _, _, size in samples])),
+                'throughput_rps': len(samples) / elapsed,
+            }
+        total = sum(len(samples) for samples in self.samples.values())
+        all_latencies = np.array([s[0] for samples in self.samples.values() for s in samples]) * 1000
+        errors = sum(row['errors'] for row in report.values())
+        report['total'] = {
+            'requests': total,
+            'errors': errors,
+            'error_rate': errors / total if total else 0.0,
+            'p50_ms': float(np.percentile(all_latencies, 50)) if total else 0.0,
+            'p95_ms': float(np.percentile(all_latencies, 95)) if total else 0.0,
+            'p99_ms': float(np.percentile(all_latencies, 99)) if total else 0.0,
+            'throughput_rps': total / elapsed,
+            'seconds': elapsed,
+        }
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help="server to load; default drives the app in-process")
+    parser.add_argument('--users', type=int, default=8, help="concurrent virtual users")
+    parser.add_argument('--sessions', type=int, default=3, help="sessions per user")
+    parser.add_argument('--think-ms', type=float, default=0, help="pause after each step")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--visible', default='world-map,scatter-plot',
+                        help="graphs in view on page load, with lazy figures")
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)  # noqa: E731
+    else:
+        from app.main import create_dash_app
+        app = create_dash_app()
+        make_client = lambda: InProcessClient(app)  # noqa: E731
+
+    client = make_client()
+    dependencies = client.get_json('/_dash-dependencies')
+    layout = layout_props(client.get_json('/_dash-layout'))
+    recorder = Recorder()
+
+    def user(index):
+        rng = random.Random(args.seed * 1000 + index)
+        user_client = make_client()
+        for _ in range(args.sessions):
+            Session(user_client, dependencies, layout, rng, args.think_ms / 1000, recorder,
+                    args.visible.split(',')).run()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        list(executor.map(user, range(args.users)))
+    report = recorder.report(time.perf_counter() - start)
+
+    print(f"{'callback':<56}{'reqs':>6}{'err %':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}")
+    for output, row in report.items():
+        print(f"{output[:55]:<56}{row['requests']:>6}{100 * row['error_rate']:>7.1f}{row['p50_ms']:>9.1f}"
+              f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['throughput_rps']:>8.1f}")
+
+    if args.output:
+        write_json(args.output, {
+            'users': args.users, 'sessions': args.sessions, 'think_ms': args.think_ms,
+            'target': args.url or 'in-process', 'callbacks': report,
+        })
+
+
+if __name__ == '__main__':
+    main()
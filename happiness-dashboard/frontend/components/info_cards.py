@@ -2,13 +2,8 @@ import dash_bootstrap_components as dbc
 from dash import html
 
 def create_info_cards(dashboard):
-    # Calculate global statistics
-    global_stats = {
-        'total_countries': len(dashboard.data['Country'].unique()),
-        'avg_happiness': round(dashboard.data['Happiness Score'].mean(), 2),
-        'top_region': dashboard.regional_insights.groupby('Region')['Happiness Score'].mean().idxmax(),
-        'recent_year': dashboard.data['Year'].max()
-    }
+    # Global statistics, precomputed with the dataset
+    global_stats = dashboard.get_info_card_stats()
     
     return dbc.Row([
         dbc.Col(
@@ -3,6 +3,7 @@ from dash import html, dcc, callback
 from dash.dependencies import Input, Output, State
 
 def create_sidebar(dashboard):
+    score_min, score_max = dashboard.summary['score_bounds']
     return dbc.Card([
         dbc.CardHeader(
             html.Div(
@@ -34,7 +35,7 @@ def create_sidebar(dashboard):
                 dcc.Dropdown(
                     id='year-selector',
                     options=dashboard.get_year_options(),
-                    value=dashboard.data['Year'].max(),
+                    value=dashboard.summary['info_cards']['recent_year'],
                     clearable=False,
                     className="mb-3 dropdown-animated"
                 ),
@@ -72,16 +73,16 @@ def create_sidebar(dashboard):
                 ),
                 dcc.RangeSlider(
                     id='happiness-range',
-                    min=dashboard.data['Happiness Score'].min(),
-                    max=dashboard.data['Happiness Score'].max(),
+                    min=score_min,
+                    max=score_max,
                     step=0.1,
                     marks={i: str(i) for i in range(
-                        int(dashboard.data['Happiness Score'].min()), 
-                        int(dashboard.data['Happiness Score'].max())+1
+                        int(score_min), 
+                        int(score_max)+1
                     )},
                     value=[
-                        dashboard.data['Happiness Score'].min(), 
-                        dashboard.data['Happiness Score'].max()
+                        score_min, 
+                        score_max
                     ],
                     className="mb-4 range-slider-animated"
                 ),
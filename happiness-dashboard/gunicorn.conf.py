@@ -0,0 +1,78 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+
+# Production settings for `gunicorn -c gunicorn.conf.py wsgi:server`.
+# Every value can be overridden through the environment.
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '8050')}"
+
+# Load the app (and the dataset) once in the master, then fork
+preload_app = True
+
+# Threaded workers: callbacks spend much of their time in numpy/pandas and
+# I/O, so a few processes with several threads each serve many sessions
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+# Workers publish their metrics here so /metrics on any worker reports all of them.
+# Only created when not configured, and removed again when gunicorn exits
+created_metrics_dir = None
+if not os.environ.get('METRICS_DIR'):
+    created_metrics_dir = os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='dashboard-metrics-')
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+# Configured here rather than in a hook so the preloaded app's startup logs
+# (dataset load, phase timings, figure warm-up) are not lost
+logging.basicConfig(level=getattr(logging, loglevel.upper(), logging.INFO))
+
+
+def post_fork(server, worker):
+    from app.snapshot import format_memory_report, worker_memory_report
+
+    server.log.info("Worker %s booted (%s)", worker.pid, format_memory_report(worker_memory_report()))
+
+
+def post_worker_init(worker):
+    from app.health import mark_draining
+
+    # Report not-ready as soon as SIGTERM arrives, then drain gracefully
+    handle_exit = worker.handle_exit
+
+    def draining_exit(sig, frame):
+        mark_draining()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, draining_exit)
+
+
+def worker_exit(server, worker):
+    server.log.info("Worker %s exiting", worker.pid)
+
+
+def child_exit(server, worker):
+    from app.metrics import registry
+
+    # An exited or recycled worker's samples no longer count towards /metrics
+    registry.remove(worker.pid)
+
+
+def on_exit(server):
+    if created_metrics_dir:
+        shutil.rmtree(created_metrics_dir, ignore_errors=True)
@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 import flask
@@ -6,10 +7,10 @@ import flask
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
-from app.main import create_dash_app
 
-# Run the application
-if __name__ == "__main__":
+def run_dev_server():
+    from app.main import create_dash_app
+
     app = create_dash_app()
 
     # Override Dash's default server run method to customize the startup message
@@ -25,4 +26,25 @@ if __name__ == "__main__":
 
     app.server.run = custom_run
 
-    app.run_server(host='0.0.0.0', port=8050, debug=True)
\ No newline at end of file
+    app.run_server(host='0.0.0.0', port=8050, debug=True)
+
+
+def run_production_server():
+    # Hand the process over to gunicorn; settings live in gunicorn.conf.py
+    config = os.path.join(project_root, 'gunicorn.conf.py')
+    os.chdir(project_root)
+    os.execvp('gunicorn', ['gunicorn', '-c', config, 'wsgi:server'])
+
+
+# Run the application
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Global Happiness Explorer")
+    parser.add_argument('--dev', action='store_true',
+                        default=os.environ.get('DASH_DEV_SERVER') == '1',
+                        help="run Flask's debug server with the reloader instead of gunicorn")
+    args = parser.parse_args()
+
+    if args.dev:
+        run_dev_server()
+    else:
+        run_production_server()
@@ -0,0 +1,16 @@
+import os
+import sys
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+from app.startup import startup
+
+with startup.phase('imports'):
+    from app.main import create_dash_app
+
+# Built once at import time; with preload_app the gunicorn master imports this
+# before forking so every worker starts with the dataset already loaded
+app = create_dash_app()
+server = app.server